@@ -0,0 +1,122 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import conversion
+import diagnostics
+
+CNL2ASP = "cnl2asp"
+CNL2TEL = "cnl2tel"
+ASP2CNL = "asp2cnl"
+INPUT_EXTENSIONS = {CNL2ASP: ['.cnl'], CNL2TEL: ['.cnl'], ASP2CNL: ['.asp', '.lp']}
+OUTPUT_EXTENSIONS = {CNL2ASP: '.asp', CNL2TEL: '.lp', ASP2CNL: '.cnl'}
+
+
+def collect_inputs(paths: list[str], mode: str) -> list[str]:
+    """Expand the directories and glob patterns given on the command line to the list of files to convert."""
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for extension in INPUT_EXTENSIONS[mode]:
+                inputs += sorted(glob.glob(os.path.join(path, '**', f'*{extension}'), recursive=True))
+        else:
+            inputs += sorted(glob.glob(path, recursive=True))
+    return list(dict.fromkeys(inputs))
+
+
+def convert_file(path: str, mode: str, options: dict) -> tuple[str, conversion.Conversion, float]:
+    start = time.perf_counter()
+    try:
+        with open(path, encoding='utf-8') as file:
+            content = file.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return path, conversion.Conversion(diagnostics=[diagnostics.from_exception(e)]), time.perf_counter() - start
+    if mode == CNL2ASP:
+        result = conversion.cnl_to_asp(content, options['print_with_functions'], options['optimize'],
+                                       options['selected_symbols'])
+    elif mode == CNL2TEL:
+        result = conversion.cnl_to_telingo(content, options['print_with_functions'], options['optimize'],
+                                           options['selected_symbols'])
+    else:
+        result = conversion.asp_to_cnl(content, options['definitions'])
+    # the symbols and the specification are not needed by the caller, and are expensive to pickle
+    return path, result._replace(symbols={}, specification=None), time.perf_counter() - start
+
+
+def output_path(path: str, mode: str, output_directory: str, root: str) -> str:
+    relative = os.path.relpath(path, root) if root else os.path.basename(path)
+    return os.path.join(output_directory, os.path.splitext(relative)[0] + OUTPUT_EXTENSIONS[mode])
+
+
+def run(inputs: list[str], mode: str, output_directory: str, manifest: str, workers: int, options: dict):
+    """
+    Convert the input files on a pool of processes, writing each result and its manifest entry as soon as it completes.
+
+    Returns the number of files that could not be converted.
+    """
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in inputs]) if inputs else None
+    failures = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor, open(manifest, 'w') as manifest_file:
+        futures = {executor.submit(convert_file, path, mode, options): path for path in inputs}
+        for future in as_completed(futures):
+            try:
+                path, result, elapsed = future.result()
+            except Exception as e:
+                # a worker of the pool failed, or the result could not be pickled
+                path, result, elapsed = futures[future], conversion.Conversion(
+                    diagnostics=[diagnostics.from_exception(e)]), 0
+            entry = {'input': path, 'output': None, 'status': 'ok' if result.ok else 'error',
+                     'seconds': round(elapsed, 6),
+                     'diagnostics': [diagnostic._asdict() for diagnostic in result.diagnostics]}
+            if result.ok:
+                entry['output'] = output_path(os.path.abspath(path), mode, output_directory, root)
+                try:
+                    os.makedirs(os.path.dirname(entry['output']), exist_ok=True)
+                    with open(entry['output'], 'w', encoding='utf-8') as output_file:
+                        output_file.write(result.output)
+                except OSError as e:
+                    entry.update(output=None, status='error',
+                                 diagnostics=[diagnostics.from_exception(e)._asdict()])
+            if entry['status'] == 'error':
+                failures += 1
+            manifest_file.write(json.dumps(entry) + '\n')
+            manifest_file.flush()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert directories of CNL or ASP files without the web interface.')
+    parser.add_argument('inputs', nargs='+', help='files, directories or glob patterns to convert')
+    parser.add_argument('-m', '--mode', choices=[CNL2ASP, CNL2TEL, ASP2CNL], default=CNL2ASP)
+    parser.add_argument('-o', '--output', default='output', help='directory where the results are written')
+    parser.add_argument('--manifest', help='JSONL file with the outcome of each conversion '
+                                           '(default: manifest.jsonl in the output directory)')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--optimize', action='store_true', help='optimize the encodings with ngo')
+    parser.add_argument('--selected-symbols', nargs='*', default=[],
+                        help='symbols (name/arity) kept in the output of the optimized encodings')
+    parser.add_argument('--print-with-functions', action='store_true',
+                        help='print the fields as functions, when the field is itself defined as a concept')
+    parser.add_argument('--definitions', help='CNL file with the concept definitions used by asp2cnl')
+    args = parser.parse_args()
+
+    definitions = ''
+    if args.definitions:
+        with open(args.definitions) as file:
+            definitions = file.read()
+    inputs = collect_inputs(args.inputs, args.mode)
+    os.makedirs(args.output, exist_ok=True)
+    manifest = args.manifest or os.path.join(args.output, 'manifest.jsonl')
+    options = {'print_with_functions': args.print_with_functions, 'optimize': args.optimize,
+               'selected_symbols': args.selected_symbols, 'definitions': definitions}
+    failures = run(inputs, args.mode, args.output, manifest, args.workers, options)
+    print(f'Converted {len(inputs) - failures} of {len(inputs)} files, manifest written to {manifest}.')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""
+Programs used by the benchmarks, generated by replicating small problems with distinct concepts.
+
+The programs only depend on their size, so that the results of different runs are comparable.
+"""
+
+SIZES = {'small': 1, 'medium': 5, 'large': 20}
+
+ASP_DEFINITIONS = """A movie is identified by an id, and has a year.
+A topmovie is identified by an id.
+"""
+
+
+def cnl_program(copies: int) -> str:
+    """A problem choosing the top movies, with an optimization statement, for each copy."""
+    statements = []
+    for i in range(copies):
+        statements += [f"A movie{i} is identified by an id.",
+                       f"A topmovie{i} is identified by an id.",
+                       f"A movie{i} goes from 1 to 5."]
+    for i in range(copies):
+        statements += [f"Whenever there is a movie{i} with id X, then we can have a topmovie{i} with id X.",
+                       f"It is required that the number of topmovie{i} is equal to 2.",
+                       f"It is prohibited that there is a topmovie{i} with id 3.",
+                       f"It is preferred, with high priority, that whenever there is a topmovie{i} with id X, "
+                       f"X is maximized."]
+    return '\n'.join(statements) + '\n'
+
+
+def asp_program(copies: int) -> str:
+    """Facts, a choice rule and constraints over the concepts of ASP_DEFINITIONS, 20 rules for each copy."""
+    rules = []
+    for i in range(copies):
+        rules += [f"movie({i * 10 + j},{2000 + j})." for j in range(10)]
+        rules += ["{topmovie(X)} :- movie(X,Y).",
+                  f":- topmovie(X), movie(X,Y), Y < {2000 + i % 10}."]
+        rules += [f":- topmovie({i * 10 + j})." for j in range(0, 10, 2)]
+        rules += [f":- movie(X,Y), topmovie(X), X > {i * 10 + j}." for j in range(3)]
+    return '\n'.join(rules) + '\n'
+
+
+def telingo_program(copies: int) -> str:
+    """A temporal problem reaching a light in its second state, for each copy."""
+    statements = []
+    for i in range(copies):
+        statements += [f"A counter{i} is identified by an id.",
+                       f"A light{i} is identified by an id."]
+    statements.append("The following propositions apply in the initial state:")
+    statements += [f"There is a counter{i} with id 1." for i in range(copies)]
+    statements.append("The following propositions always apply except in the initial state:")
+    for i in range(copies):
+        statements += [f"Whenever there is previously a counter{i} with id X, then we must have a counter{i} with id X.",
+                       f"Whenever there is a counter{i} with id X, then we can have a light{i} with id X."]
+    statements.append("The following propositions apply in the final state:")
+    statements += [f"It is prohibited that there is not a light{i} with id 1." for i in range(copies)]
+    return '\n'.join(statements) + '\n'
@@ -0,0 +1,303 @@
+"""
+Simulate concurrent browser sessions of the app, to measure how the server behaves as the load grows.
+
+Each session connects to the websocket of a Streamlit server running main.py, as the frontend does, opens one of
+its pages, pastes a program of the corpus and runs it. The server is started by this script, unless the url of a
+running one is given. For each level of concurrency, the sessions completed per second, the latency of the reruns
+and the growth of the memory of the server and of its solver workers are reported.
+
+    python -m benchmarks.load -c 1 2 4 --sessions 8
+
+Streamlit's AppTest cannot be used here: it replaces the global runtime on each run, hence its apps cannot run
+concurrently, and it does not run the pages of st.navigation.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.websocket import websocket_connect
+
+from benchmarks import corpus
+from benchmarks.run import percentile
+
+PAGES = ['CNL2ASP', 'ASP2CNL', 'CNL2TEL']
+CNL_AREA = "Insert here your CNL statements"
+DEFINITIONS_AREA = "Insert here the concept definitions"
+ASP_AREA = "Insert here your ASP encoding"
+TIMEOUT = 300
+STARTUP_TIMEOUT = 60
+MAX_MESSAGE_SIZE = 1024 * 1024 * 1024
+
+
+class Session:
+    """A browser session, speaking the websocket protocol of the Streamlit frontend."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.connection = None
+        self.page_hash = ''
+        self.pages: dict[str, str] = {}
+        self.widgets: dict[str, str] = {}
+        self.states: dict[str, WidgetState] = {}
+        self.elements = {}
+        self.fragments: dict[str, float] = {}
+        self.reruns: list[float] = []
+        self._cached = {}
+
+    async def open(self, page: str):
+        self.connection = await websocket_connect(f"{self.url.replace('http', 'ws', 1)}/_stcore/stream",
+                                                  max_message_size=MAX_MESSAGE_SIZE)
+        await self.rerun()
+        if page != PAGES[0]:
+            self.page_hash = self.pages[page]
+            await self.rerun()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+    async def rerun(self, trigger: str = None, fragment_id: str = None):
+        """Send the state of the widgets, as the frontend does on an interaction, and wait for the script."""
+        message = BackMsg()
+        message.rerun_script.page_script_hash = self.page_hash
+        if fragment_id is not None:
+            message.rerun_script.fragment_id = fragment_id
+        else:
+            self.elements = {}
+            self.fragments = {}
+        message.rerun_script.widget_states.widgets.extend(self.states.values())
+        if trigger is not None:
+            message.rerun_script.widget_states.widgets.add(id=self.widgets[trigger], trigger_value=True)
+        start = time.perf_counter()
+        await self.connection.write_message(message.SerializeToString(), binary=True)
+        await self._receive()
+        self.reruns.append(time.perf_counter() - start)
+
+    async def _receive(self):
+        while True:
+            data = await asyncio.wait_for(self.connection.read_message(), TIMEOUT)
+            if data is None:
+                raise ConnectionError('The server closed the connection.')
+            message = ForwardMsg()
+            message.ParseFromString(data)
+            if message.ref_hash:
+                path = tuple(message.metadata.delta_path)
+                message = self._cached[message.ref_hash]
+            else:
+                path = tuple(message.metadata.delta_path)
+                if message.metadata.cacheable:
+                    self._cached[message.hash] = message
+            kind = message.WhichOneof('type')
+            if kind == 'navigation':
+                self.pages = {page.page_name: page.page_script_hash for page in message.navigation.app_pages}
+                self.page_hash = self.page_hash or message.navigation.page_script_hash
+            elif kind == 'auto_rerun':
+                self.fragments[message.auto_rerun.fragment_id] = message.auto_rerun.interval
+            elif kind == 'delta' and message.delta.WhichOneof('type') == 'new_element':
+                self._add_element(path, message.delta.new_element)
+            elif kind == 'script_finished':
+                if message.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError('The script could not be compiled.')
+                if message.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    return
+
+    def _add_element(self, path: tuple, element):
+        self.elements[path] = element
+        kind = element.WhichOneof('type')
+        if kind in ('text_area', 'checkbox', 'button'):
+            self.widgets[getattr(element, kind).label] = getattr(element, kind).id
+        elif kind == 'exception':
+            raise RuntimeError(element.exception.message)
+
+    def has(self, predicate) -> bool:
+        return any(predicate(element) for element in self.elements.values())
+
+    async def input(self, label: str, text: str):
+        self.states[label] = WidgetState(id=self.widgets[label], string_value=text)
+        await self.rerun()
+
+    async def toggle(self, label: str):
+        self.states[label] = WidgetState(id=self.widgets[label], bool_value=True)
+        await self.rerun()
+
+    async def click(self, label: str):
+        await self.rerun(trigger=label)
+
+    async def wait_for_solver(self):
+        """Rerun the fragments showing the solver, as the frontend does, until it is done."""
+        deadline = time.monotonic() + TIMEOUT
+
+        def done(element):
+            return (element.WhichOneof('type') == 'markdown' and element.markdown.is_caption) or \
+                (element.WhichOneof('type') == 'alert' and element.alert.format == element.alert.ERROR)
+
+        while not self.has(done):
+            if time.monotonic() > deadline:
+                raise TimeoutError('The solver did not finish in time.')
+            if not self.fragments:
+                raise RuntimeError('The page is not solving.')
+            fragment_id, interval = next(iter(self.fragments.items()))
+            await asyncio.sleep(interval)
+            await self.rerun(fragment_id=fragment_id)
+
+
+async def cnl2asp_session(session: Session, size: int, optimize: bool):
+    await session.input(CNL_AREA, corpus.cnl_program(size))
+    if optimize:
+        await session.toggle('Optimize')
+    await session.toggle('Run')
+    await session.wait_for_solver()
+
+
+async def asp2cnl_session(session: Session, size: int, optimize: bool):
+    await session.input(DEFINITIONS_AREA, corpus.ASP_DEFINITIONS)
+    await session.input(ASP_AREA, corpus.asp_program(size))
+    await session.click('Convert')
+
+
+async def cnl2tel_session(session: Session, size: int, optimize: bool):
+    await session.input(CNL_AREA, corpus.telingo_program(size))
+    await session.toggle('Run')
+    await session.wait_for_solver()
+    await session.toggle('Parse result')
+
+
+SCENARIOS = {'CNL2ASP': cnl2asp_session, 'ASP2CNL': asp2cnl_session, 'CNL2TEL': cnl2tel_session}
+
+
+async def simulate(url: str, page: str, size: int, optimize: bool, slots: asyncio.Semaphore) -> list[float]:
+    async with slots:
+        session = Session(url)
+        try:
+            await session.open(page)
+            await SCENARIOS[page](session, size, optimize)
+        finally:
+            session.close()
+        return session.reruns
+
+
+def rss(pid: int) -> int:
+    """Return the resident set size in bytes of a process and of its descendants, 0 if it is not on this host."""
+    try:
+        with open(f'/proc/{pid}/statm') as statm:
+            total = int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return 0
+    # the children are listed by the thread that started them, and the workers of the pool are started by its
+    # dispatcher threads
+    for children_path in glob.glob(f'/proc/{pid}/task/*/children'):
+        try:
+            with open(children_path) as children:
+                total += sum(rss(int(child)) for child in children.read().split())
+        except OSError:
+            # the thread exited
+            pass
+    return total
+
+
+async def load(url: str, pid: int, concurrency: int, sessions: int, pages: list[str], sizes: list[str],
+               optimize: bool, seed: int) -> dict:
+    generator = random.Random(seed)
+    plan = [(generator.choice(pages), corpus.SIZES[generator.choice(sizes)]) for _ in range(sessions)]
+    memory = rss(pid)
+    slots = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+    results = await asyncio.gather(*[simulate(url, page, size, optimize, slots) for page, size in plan],
+                                   return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    reruns = []
+    failures = 0
+    for result in results:
+        if isinstance(result, BaseException):
+            failures += 1
+            print(f"Session failed: {result!r}", file=sys.stderr)
+        else:
+            reruns += result
+    return {
+        'concurrency': concurrency,
+        'sessions': sessions,
+        'failures': failures,
+        'throughput': round((sessions - failures) / elapsed, 6),
+        'reruns': len(reruns),
+        'rerun_latency': {f'p{q}': round(percentile(reruns, q), 6) for q in (50, 95, 99)} if reruns else {},
+        'rss': rss(pid),
+        'rss_growth': rss(pid) - memory,
+    }
+
+
+def start_server() -> tuple[subprocess.Popen, str]:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen([sys.executable, '-m', 'streamlit', 'run', 'main.py', '--server.headless=true',
+                               f'--server.port={port}', '--server.address=127.0.0.1',
+                               '--browser.gatherUsageStats=false'],
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while True:
+        try:
+            with urllib.request.urlopen(f'{url}/_stcore/health', timeout=1):
+                return server, url
+        except OSError:
+            if server.poll() is not None or time.monotonic() > deadline:
+                server.kill()
+                raise RuntimeError('The server did not start.')
+            time.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate concurrent browser sessions of the app.')
+    parser.add_argument('-c', '--concurrency', type=int, nargs='+', default=[1, 2, 4],
+                        help='numbers of concurrent sessions to simulate')
+    parser.add_argument('--sessions', type=int, default=8, help='sessions simulated at each level of concurrency')
+    parser.add_argument('-p', '--pages', nargs='+', choices=PAGES, default=PAGES)
+    parser.add_argument('-s', '--sizes', nargs='+', choices=list(corpus.SIZES), default=['small', 'medium'])
+    parser.add_argument('--optimize', action='store_true', help='also toggle Optimize on the CNL2ASP page')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the choice of the pages and programs')
+    parser.add_argument('--url', help='url of a running server, instead of starting one')
+    parser.add_argument('--pid', type=int, help='process of the running server, to measure its memory')
+    parser.add_argument('-o', '--output', help='JSON file where the results are written')
+    args = parser.parse_args()
+
+    server = None
+    url, pid = args.url, args.pid
+    if url is None:
+        server, url = start_server()
+        pid = server.pid
+    try:
+        results = []
+        for concurrency in args.concurrency:
+            result = asyncio.run(load(url, pid, concurrency, args.sessions, args.pages, args.sizes, args.optimize,
+                                      args.seed))
+            results.append(result)
+            latency = result['rerun_latency']
+            print(f"concurrency {concurrency}: {result['throughput']:.3f} sessions/s, {result['failures']} failed, "
+                  f"rerun p50 {latency.get('p50', 0):.3f}s, p95 {latency.get('p95', 0):.3f}s, "
+                  f"p99 {latency.get('p99', 0):.3f}s, memory {result['rss'] / 1024 / 1024:.1f} MiB "
+                  f"({result['rss_growth'] / 1024 / 1024:+.1f} MiB)")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    return 1 if any(result['failures'] for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
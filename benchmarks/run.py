@@ -0,0 +1,201 @@
+"""
+Benchmark the conversion pipelines of the pages outside Streamlit.
+
+Each pipeline runs on the programs of the corpus with the caches cleared, timing its phases as the pages do. A last
+run traces the Python allocations to measure the peak memory of each phase. The results can be saved as JSON and
+compared with those of a previous run to detect regressions.
+
+    python -m benchmarks.run -n 5 -o results.json
+    python -m benchmarks.run --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import cache
+import constants
+import conversion
+import instrumentation
+import pool
+import solver
+import store
+from benchmarks import corpus
+
+PIPELINES = ['cnl2asp', 'asp2cnl', 'cnl2tel']
+TIME_LIMIT = 60
+HORIZON = 20
+
+
+class MemoryProfiler(instrumentation.Profiler):
+    """Profiler also recording the peak of the memory allocated by Python in each phase."""
+
+    def __init__(self):
+        super().__init__()
+        self.memory: dict[str, int] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        with super().phase(name):
+            yield
+        peak = tracemalloc.get_traced_memory()[1] - start
+        self.memory[name] = max(self.memory.get(name, 0), peak)
+
+
+def clear_caches():
+    import incremental
+    for value in vars(cache).values():
+        if isinstance(value, cache.BoundedCache):
+            value.clear()
+    incremental.statement_cache.clear()
+    # the workers keep the controls they grounded
+    started_pool = pool.started_pool()
+    if started_pool is not None:
+        started_pool.restart()
+
+
+def run_cnl2asp(profiler: instrumentation.Profiler, size: int, optimize: bool) -> dict:
+    result = conversion.cnl_to_asp(corpus.cnl_program(size), optimize=optimize, profiler=profiler)
+    if not result.ok:
+        raise RuntimeError('\n'.join(str(diagnostic) for diagnostic in result.diagnostics))
+    with profiler.phase('solve'):
+        job = solver.SolveJob(result.output, TIME_LIMIT)
+        job.wait()
+    if job.status == solver.ERROR:
+        raise RuntimeError('\n'.join(job.messages))
+    return job.statistics
+
+
+def run_asp2cnl(profiler: instrumentation.Profiler, size: int, optimize: bool) -> dict:
+    with profiler.phase('translate'):
+        result = conversion.asp_to_cnl(corpus.asp_program(size), corpus.ASP_DEFINITIONS, parallel=True)
+    if not result.ok:
+        raise RuntimeError('\n'.join(str(diagnostic) for diagnostic in result.diagnostics))
+    return {}
+
+
+def run_cnl2tel(profiler: instrumentation.Profiler, size: int, optimize: bool) -> dict:
+    result = conversion.cnl_to_telingo(corpus.telingo_program(size), optimize=optimize, profiler=profiler)
+    if not result.ok:
+        raise RuntimeError('\n'.join(str(diagnostic) for diagnostic in result.diagnostics))
+    with profiler.phase('solve'):
+        job = solver.TelingoJob(result.output, TIME_LIMIT, HORIZON)
+        job.wait()
+    if job.status == solver.ERROR:
+        raise RuntimeError('\n'.join(job.messages))
+    with profiler.phase('parse'):
+        ''.join(conversion.parse_telingo_states(result.specification, job.output))
+    return job.statistics
+
+
+RUNNERS = {'cnl2asp': run_cnl2asp, 'asp2cnl': run_asp2cnl, 'cnl2tel': run_cnl2tel}
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile, so that the reported values are actual measurements."""
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * q // 100) - 1)]
+
+
+def benchmark(pipeline: str, size: int, repeat: int, optimize: bool) -> dict:
+    runner = RUNNERS[pipeline]
+    # the first run imports the compilers and starts the workers
+    clear_caches()
+    runner(instrumentation.Profiler(), size, optimize)
+    phases = {}
+    totals = []
+    worker_rss = 0
+    for _ in range(repeat):
+        clear_caches()
+        profiler = instrumentation.Profiler()
+        statistics = runner(profiler, size, optimize)
+        totals.append(time.perf_counter() - profiler.start)
+        for name, elapsed in profiler.phases.items():
+            phases.setdefault(name, []).append(elapsed)
+        worker_rss = max(worker_rss, statistics.get('peak_rss', 0))
+    clear_caches()
+    tracemalloc.start()
+    profiler = MemoryProfiler()
+    try:
+        runner(profiler, size, optimize)
+    finally:
+        tracemalloc.stop()
+    return {
+        'runs': repeat,
+        'throughput': round(repeat / sum(totals), 6),
+        'phases': {name: {'p50': round(percentile(values, 50), 6), 'p95': round(percentile(values, 95), 6),
+                          'peak_memory': profiler.memory.get(name, 0)}
+                   for name, values in {**phases, 'total': totals}.items()},
+        'worker_peak_rss': worker_rss,
+    }
+
+
+def metadata() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'commit': commit, 'python': platform.python_version(),
+            'platform': platform.platform(), 'cpus': os.cpu_count(), 'versions': store.library_versions()}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return the phases whose median time grew by more than the tolerance with respect to the baseline."""
+    regressions = []
+    for name, result in results.items():
+        for phase, values in result['phases'].items():
+            previous = baseline.get(name, {}).get('phases', {}).get(phase)
+            if previous and values['p50'] > previous['p50'] * (1 + tolerance):
+                regressions.append(f"{name} {phase}: p50 {previous['p50']:.3f}s -> {values['p50']:.3f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the conversion pipelines on the corpus.')
+    parser.add_argument('-p', '--pipelines', nargs='+', choices=PIPELINES, default=PIPELINES)
+    parser.add_argument('-s', '--sizes', nargs='+', choices=list(corpus.SIZES), default=list(corpus.SIZES))
+    parser.add_argument('-n', '--repeat', type=int, default=5, help='measured runs of each benchmark')
+    parser.add_argument('--optimize', action='store_true', help='optimize the encodings with ngo')
+    parser.add_argument('-o', '--output', help='JSON file where the results are written')
+    parser.add_argument('--compare', help='JSON file with the results of a previous run')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='relative growth of a median time reported as a regression (default: 0.2)')
+    args = parser.parse_args()
+
+    # the benchmarks measure the conversions, not the persistent store
+    constants.PERSISTENT_CACHE_PATH = None
+    results = {}
+    for pipeline in args.pipelines:
+        for size in args.sizes:
+            name = f'{pipeline}/{size}'
+            results[name] = benchmark(pipeline, corpus.SIZES[size], args.repeat, args.optimize)
+            total = results[name]['phases']['total']
+            print(f"{name}: {results[name]['throughput']:.3f} runs/s, p50 {total['p50']:.3f}s, "
+                  f"p95 {total['p95']:.3f}s")
+            for phase, values in results[name]['phases'].items():
+                if phase != 'total':
+                    print(f"    {phase}: p50 {values['p50']:.3f}s, p95 {values['p95']:.3f}s, "
+                          f"peak memory {values['peak_memory'] / 1024 / 1024:.1f} MiB")
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'metadata': metadata(), 'optimize': args.optimize, 'results': results}, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline['results'], args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
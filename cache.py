@@ -0,0 +1,104 @@
+import hashlib
+import sys
+import threading
+
+from cachetools import LRUCache
+
+import constants
+import store
+
+
+def digest(*parts) -> str:
+    """Return a stable content hash of the given parts, used as cache key."""
+    hasher = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        hasher.update(repr(part).encode())
+        hasher.update(b'\0')
+    return hasher.hexdigest()
+
+
+def sizeof(value, seen=None) -> int:
+    """Approximate the memory footprint in bytes of a cached value."""
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes)):
+        return size
+    if isinstance(value, dict):
+        size += sum(sizeof(k, seen) + sizeof(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(sizeof(item, seen) for item in value)
+    elif hasattr(value, '__dict__'):
+        size += sizeof(vars(value), seen)
+    return size
+
+
+class BoundedCache:
+    """
+    Thread-safe LRU cache bounded by the total size in bytes of its values.
+
+    If it has a name, the values are also written to the persistent store, when it is enabled, and the misses
+    are looked up there.
+    """
+
+    def __init__(self, max_bytes: int, name: str = None):
+        self.name = name
+        self._cache = LRUCache(maxsize=max_bytes, getsizeof=sizeof)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stored_hits = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                return self._cache[key]
+        persistent_store = store.get_store() if self.name is not None else None
+        value = persistent_store.get(self.name, key) if persistent_store is not None else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return default
+            self.stored_hits += 1
+            self._put(key, value)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._put(key, value)
+        persistent_store = store.get_store() if self.name is not None else None
+        if persistent_store is not None:
+            persistent_store.put(self.name, key, value)
+
+    def _put(self, key, value):
+        try:
+            self._cache[key] = value
+        except ValueError:
+            # the value alone exceeds the cache size, just do not store it
+            pass
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+            self.stored_hits = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'stored_hits': self.stored_hits, 'misses': self.misses, 'entries': len(self._cache),
+                    'bytes': self._cache.currsize, 'max_bytes': self._cache.maxsize}
+
+
+compilation_cache = BoundedCache(constants.COMPILATION_CACHE_SIZE, 'compilation')
+optimization_cache = BoundedCache(constants.OPTIMIZATION_CACHE_SIZE, 'optimization')
+symbol_cache = BoundedCache(constants.SYMBOL_CACHE_SIZE, 'symbols')
+rule_cache = BoundedCache(constants.RULE_CACHE_SIZE, 'rules')
+solver_cache = BoundedCache(constants.SOLVER_CACHE_SIZE, 'solver')
+llm_cache = BoundedCache(constants.LLM_CACHE_SIZE)
+upload_cache = BoundedCache(constants.UPLOAD_CACHE_SIZE)
+instance_cache = BoundedCache(constants.INSTANCE_CACHE_SIZE)
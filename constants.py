@@ -9,4 +9,71 @@ SYMBOLS = "symbols"
 SELECTED_SYMBOLS = "selected_symbols"
 STR_2_SYMBOL = "str_2_symbol"
 PARSE_RESULT = 'parse_result'
-ASP2NL_MODEL = 0
+SPECIFICATION = 'specification'
+PRINT_WITH_FUNCTIONS = "print_with_functions"
+COMPILED = "compiled"
+SOLVED = "solved"
+INCREMENTAL = "incremental"
+TIME_LIMIT = "solver_time_limit"
+SOLVE_JOB = "solve_job"
+INSTANCE = "instance"
+MODELS = "solver_models"
+OPTIMAL_ONLY = "solver_optimal_only"
+THREADS = "solver_threads"
+PARALLEL_MODE = "solver_parallel_mode"
+HORIZON = "telingo_horizon"
+STOP_AT_FIRST_MODEL = "telingo_stop_at_first_model"
+MODELS_PER_PAGE = 20
+COMPILATION_CACHE_SIZE = 64 * 1024 * 1024
+STATEMENT_CACHE_SIZE = 64 * 1024 * 1024
+OPTIMIZATION_CACHE_SIZE = 32 * 1024 * 1024
+SYMBOL_CACHE_SIZE = 32 * 1024 * 1024
+RULE_CACHE_SIZE = 32 * 1024 * 1024
+LLM_CACHE_SIZE = 8 * 1024 * 1024
+SOLVER_CACHE_SIZE = 32 * 1024 * 1024
+UPLOAD_CACHE_SIZE = 256 * 1024 * 1024
+INSTANCE_CACHE_SIZE = 256 * 1024 * 1024
+# path of the SQLite file shared by the processes of the host, None to only cache in memory
+PERSISTENT_CACHE_PATH = None
+PERSISTENT_CACHE_SIZE = 512 * 1024 * 1024
+PERSISTENT_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+UPLOAD_SIZE_LIMIT = 64 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# the inputs longer than this number of characters are shown in a read-only window instead of the editor
+EDITOR_SIZE_LIMIT = 256 * 1024
+WINDOW_LINES = 500
+# the facts of the instances are passed to clingo in batches of INSTANCE_BATCH_SIZE statements
+INSTANCE_BATCH_SIZE = 10000
+APP_URL = "https://cnl2asp.streamlit.app"
+# the longer links are replaced by short links, when they are enabled
+LINK_LENGTH_LIMIT = 2000
+# path of the SQLite file of the short links, None to always put the state in the links
+SHORT_LINKS_PATH = None
+TRANSLATION_CHUNK_SIZE = 100
+PARALLEL_TRANSLATION_THRESHOLD = 500
+SOLVER_WORKERS = 2
+SOLVER_QUEUE_SIZE = 16
+SOLVER_JOBS_PER_WORKER = 20
+SOLVER_MEMORY_LIMIT = 2 * 1024 * 1024 * 1024
+SOLVER_CPU_LIMIT = 300
+WORKER_PRELOAD = ['solver']
+# grounded controls kept by each worker, to solve the same rules again without grounding them
+CONTROLS_PER_WORKER = 2
+# the runs whose grounding exceeds GROUNDING_LIMIT rules are refused, None to solve without analyzing the grounding
+GROUNDING_LIMIT = 2_000_000
+GROUNDING_WARNING = 200_000
+COSTLY_STATEMENTS = 5
+WARM_UP = True
+# the metrics are served on http://METRICS_HOST:METRICS_PORT/metrics by each server process, None to disable them
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9464
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+# the size of the state of each session is measured at most every METRICS_SESSION_INTERVAL seconds, and the
+# sessions not seen for METRICS_SESSION_TTL seconds are dropped
+METRICS_SESSION_INTERVAL = 30
+METRICS_SESSION_TTL = 600
+LLM_MODELS = ['llama-3.3-70b-versatile', 'distil-whisper-large-v3-en', 'gemma2-9b-it', 'llama-3.1-8b-instant',
+              'llama-guard-3-8b', 'llama3-70b-8192', 'llama3-8b-8192', 'mixtral-8x7b-32768', 'whisper-large-v3',
+              'whisper-large-v3-turbo']
+LLM_RATE_LIMIT_BACKOFF = 60
+LLM_FAILURE_BACKOFF = 600
@@ -0,0 +1,277 @@
+import copy
+import os
+import re
+from typing import Iterator, NamedTuple
+
+import cache
+import constants
+import diagnostics
+import instrumentation
+import metrics
+import pool
+
+# the weight of a weak constraint, following the period ending its body
+WEIGHT = re.compile(r'\s*\[')
+
+# the compilers take seconds to import, hence they are only imported by the conversions using them
+
+
+class Conversion(NamedTuple):
+    """
+    The result of a conversion: the output, or None if it failed, with its diagnostics.
+
+    symbols maps the name/arity of the concepts defined in the CNL to their symbols, and specification is the
+    structure of the CNL used to parse the telingo results.
+    """
+    output: str = None
+    symbols: dict = {}
+    diagnostics: list = []
+    specification: object = None
+
+    @property
+    def ok(self) -> bool:
+        return self.output is not None
+
+
+def _cnl_to_asp(kind: str, cnl_input: str, print_with_functions: bool, optimize: bool, selected_symbols: list[str],
+                incremental_compilation: bool, profiler: instrumentation.Profiler) -> Conversion:
+    optimize_settings = sorted(selected_symbols) if optimize else None
+    key = cache.digest(kind, cnl_input, print_with_functions, optimize, optimize_settings)
+    cached = cache.compilation_cache.get(key)
+    if cached is not None:
+        return cached
+    if profiler is None:
+        profiler = instrumentation.Profiler()
+    try:
+        with profiler.phase('import'):
+            from cnl2asp.parser.parser import CNLTransformer
+            from cnl2asp.utility.utility import Utility
+            import incremental
+        with incremental.compile_lock:
+            Utility.PRINT_WITH_FUNCTIONS = print_with_functions
+            tool = incremental.Cnl2asp(cnl_input)
+            compiled = None
+            specification = None
+            with profiler.phase('compile'), diagnostics.capture() as captured:
+                if incremental_compilation:
+                    compiled = incremental.compile_statements(cnl_input)
+                if compiled is None:
+                    asp_encoding = tool.compile()
+                    if kind == 'cnl2tel':
+                        # the parse tree of the compilation is transformed again, since the conversion alters
+                        # the specification
+                        specification = CNLTransformer().transform(tool.parse_input())
+                else:
+                    asp_encoding, symbols = compiled
+            if captured:
+                return Conversion(diagnostics=captured)
+            if compiled is None:
+                with profiler.phase('compile'):
+                    symbols = tool.get_symbols()
+            str_2_symbol = {}
+            for symbol in symbols:
+                # CNL2TEL only lists the symbols with a predicate
+                if symbol.predicate or kind == 'cnl2asp':
+                    str_2_symbol[f"{symbol.predicate}/{len(symbol.attributes)}"] = symbol
+            if optimize:
+                with profiler.phase('optimize'), metrics.timed(kind, 'optimize'):
+                    asp_encoding = tool.optimize(asp_encoding, [str_2_symbol[x] for x in selected_symbols])
+    except Exception as e:
+        return Conversion(diagnostics=[diagnostics.from_exception(e)])
+    result = Conversion(asp_encoding, str_2_symbol, specification=specification)
+    cache.compilation_cache.put(key, result)
+    return result
+
+
+def cnl_to_asp(cnl_input: str, print_with_functions: bool = False, optimize: bool = False,
+               selected_symbols: list[str] = (), incremental_compilation: bool = False,
+               profiler: instrumentation.Profiler = None) -> Conversion:
+    """
+    Compile CNL statements to ASP, optionally optimizing the encoding with ngo for the selected symbols.
+
+    The results are cached by their inputs, and the compilation time is recorded in the given profiler.
+    """
+    return _cnl_to_asp('cnl2asp', cnl_input, print_with_functions, optimize, selected_symbols,
+                       incremental_compilation, profiler)
+
+
+def cnl_to_telingo(cnl_input: str, print_with_functions: bool = False, optimize: bool = False,
+                   selected_symbols: list[str] = (), profiler: instrumentation.Profiler = None) -> Conversion:
+    """Compile temporal CNL statements to a telingo encoding, as cnl_to_asp."""
+    return _cnl_to_asp('cnl2tel', cnl_input, print_with_functions, optimize, selected_symbols, False, profiler)
+
+
+def grounding_sections(cnl_input: str, asp_encoding: str, print_with_functions: bool = False,
+                       optimized: bool = False) -> list[tuple[str, str]]:
+    """
+    Split an encoding in the sections analyzed by grounding.analyze: the rules of each CNL statement, or each rule
+    if the encoding was optimized or the CNL cannot be compiled statement by statement.
+
+    The sections hold exactly the rules of the encoding, since the program they ground is then solved.
+    """
+    rules = split_rules(asp_encoding)
+    if not optimized:
+        from cnl2asp.utility.utility import Utility
+        import incremental
+        with incremental.compile_lock:
+            Utility.PRINT_WITH_FUNCTIONS = print_with_functions
+            sections = incremental.statement_rules(cnl_input)
+        if sections is not None and \
+                sorted(rule for _, program in sections for rule in split_rules(program)) == sorted(rules):
+            return sections
+    return [(rule, rule) for rule in rules]
+
+
+def parse_telingo_states(specification, model: str) -> Iterator[str]:
+    """
+    Yield the CNL sentences of each state of a telingo model, in order.
+
+    The states share a single parser, which lists first the sentences already holding in the previous states.
+    """
+    from cnl2asp.ASP_elements.solver.telingo_result_parser import TelingoResultParser
+    parser = TelingoResultParser(specification)
+    for state in re.split(r'(?=State)', model):
+        if state.strip():
+            yield parser.parse_model(state)
+
+
+def definition_symbols(definitions: str) -> list:
+    """
+    Return the symbols of the concepts defined in the given CNL, parsing each distinct text only once.
+
+    A copy of the cached symbols is returned, since asp2cnl modifies them while translating the rules.
+    """
+    key = cache.digest('symbols', definitions)
+    symbols = cache.symbol_cache.get(key)
+    if symbols is None:
+        import incremental
+        with incremental.compile_lock:
+            symbols = incremental.Cnl2asp(definitions).get_symbols()
+        cache.symbol_cache.put(key, symbols)
+    return copy.deepcopy(symbols)
+
+
+def split_rules(asp_encoding: str) -> list[str]:
+    """
+    Split an ASP encoding in its rules, dropping the comments and collapsing the whitespace outside strings.
+
+    The normalized text of the rules is used to memoize their translation.
+    """
+    rules = []
+    rule = []
+    weight = False
+    i = 0
+    while i < len(asp_encoding):
+        char = asp_encoding[i]
+        if char == '"':
+            end = i + 1
+            while end < len(asp_encoding) and asp_encoding[end] != '"':
+                end += 2 if asp_encoding[end] == '\\' else 1
+            rule.append(asp_encoding[i:end + 1])
+            i = end
+        elif asp_encoding.startswith('%*', i):
+            end = asp_encoding.find('*%', i + 2)
+            i = len(asp_encoding) if end == -1 else end + 1
+        elif char == '%':
+            end = asp_encoding.find('\n', i)
+            i = len(asp_encoding) if end == -1 else end
+        elif char.isspace():
+            if rule and rule[-1] != ' ':
+                rule.append(' ')
+        elif char == '.' and asp_encoding[i + 1:i + 2] != '.' and asp_encoding[i - 1:i] != '.':
+            rule.append(char)
+            weight = WEIGHT.match(asp_encoding, i + 1) is not None
+            if not weight:
+                rules.append(''.join(rule).strip())
+                rule = []
+        elif char == ']' and weight:
+            rule.append(char)
+            rules.append(''.join(rule).strip())
+            rule = []
+            weight = False
+        else:
+            rule.append(char)
+        i += 1
+    if ''.join(rule).strip():
+        rules.append(''.join(rule).strip())
+    return rules
+
+
+def _translate(rule: str, symbols: list) -> str:
+    from asp2cnl.compiler import compile_rule
+    from asp2cnl.parser import ASPParser
+    return '\n'.join(compile_rule(parsed, symbols) for parsed in ASPParser(rule + '\n').parse())
+
+
+def translate_chunk(payload, channel: pool.Channel):
+    rules, definitions = payload
+    symbols = definition_symbols(definitions)
+    channel.send([_translate(rule, symbols) for rule in rules])
+
+
+class TranslationJob(pool.Job):
+    """Translates a chunk of rules on the worker pool."""
+
+    def __init__(self, rules: list[str], definitions: str):
+        super().__init__(translate_chunk, (rules, definitions), constants.SOLVER_CPU_LIMIT)
+        self.translations = None
+
+    def on_message(self, translations):
+        self.translations = translations
+
+
+def translate_rules(asp_encoding: str, definitions: str, parallel: bool = False) -> Iterator[str]:
+    """
+    Yield the CNL translation of each rule of an ASP encoding, in order.
+
+    The translations are memoized by the rule and the definitions, so that only the rules edited since the previous
+    call are translated. If parallel, chunks of rules to translate are sent to the worker pool.
+    """
+    rules = split_rules(asp_encoding)
+    definitions_key = cache.digest('definitions', definitions)
+    keys = [cache.digest('rule', definitions_key, rule) for rule in rules]
+    translations = [cache.rule_cache.get(key) for key in keys]
+    missing = [i for i, translation in enumerate(translations) if translation is None]
+    jobs = {}
+    # the workers take a few seconds to import the parsers, so only large encodings are worth distributing
+    if parallel and len(missing) > constants.PARALLEL_TRANSLATION_THRESHOLD and os.cpu_count() > 1:
+        for start in range(0, len(missing), constants.TRANSLATION_CHUNK_SIZE):
+            chunk = missing[start:start + constants.TRANSLATION_CHUNK_SIZE]
+            job = TranslationJob([rules[i] for i in chunk], definitions)
+            try:
+                pool.get_pool().submit(job)
+            except pool.PoolBusy:
+                # the remaining rules are translated here
+                break
+            for i in chunk:
+                jobs[i] = (job, chunk)
+    symbols = None
+    try:
+        for i, rule in enumerate(rules):
+            if translations[i] is None:
+                if i in jobs:
+                    job, chunk = jobs[i]
+                    job.wait()
+                    if job.error is not None:
+                        raise RuntimeError(job.error)
+                    for j, translation in zip(chunk, job.translations):
+                        translations[j] = translation
+                        cache.rule_cache.put(keys[j], translation)
+                else:
+                    if symbols is None:
+                        symbols = definition_symbols(definitions)
+                    translations[i] = _translate(rule, symbols)
+                    cache.rule_cache.put(keys[i], translations[i])
+            yield translations[i]
+    finally:
+        for job, _ in jobs.values():
+            job.cancel()
+
+
+def asp_to_cnl(asp_encoding: str, definitions: str, parallel: bool = False) -> Conversion:
+    """Translate the rules of an ASP encoding to CNL, using the concepts of the given CNL definitions."""
+    try:
+        return Conversion(''.join(f'{translation}\n' for translation in
+                                  translate_rules(asp_encoding, definitions, parallel)))
+    except Exception as e:
+        return Conversion(diagnostics=[diagnostics.from_exception(e)])
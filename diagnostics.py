@@ -0,0 +1,85 @@
+import re
+import sys
+import threading
+from contextlib import contextmanager
+from io import StringIO
+from typing import NamedTuple
+
+from lark.exceptions import UnexpectedInput, VisitError
+
+ERROR = "error"
+WARNING = "warning"
+
+
+class Diagnostic(NamedTuple):
+    severity: str
+    message: str
+    line: int = None
+    column: int = None
+
+    def __str__(self):
+        return self.message
+
+
+def from_exception(exception: Exception) -> Diagnostic:
+    """Build the diagnostic of an exception raised by the compiler, locating it in the input if possible."""
+    if isinstance(exception, VisitError):
+        exception = exception.orig_exc
+    if isinstance(exception, UnexpectedInput):
+        # the end of the input is reported at line -1
+        if exception.line < 1:
+            return Diagnostic(ERROR, str(exception))
+        return Diagnostic(ERROR, str(exception), exception.line, exception.column)
+    # the compilation errors of cnl2asp only report the line in their message
+    match = re.search(r'at line (\d+)', str(exception))
+    return Diagnostic(ERROR, str(exception), int(match.group(1)) if match else None)
+
+
+class _ThreadLocalStream:
+    """Stream writing to the buffer of the current thread while it is capturing, and to the wrapped stream otherwise."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.local = threading.local()
+
+    def _target(self):
+        buffer = getattr(self.local, 'buffer', None)
+        return self._stream if buffer is None else buffer
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+_install_lock = threading.Lock()
+
+
+def _thread_local_stdout() -> _ThreadLocalStream:
+    with _install_lock:
+        if not isinstance(sys.stdout, _ThreadLocalStream):
+            sys.stdout = _ThreadLocalStream(sys.stdout)
+        return sys.stdout
+
+
+@contextmanager
+def capture():
+    """
+    Collect what the current thread prints as warnings, leaving the output of the other threads untouched.
+
+    The diagnostics are added to the yielded list when the block exits, even if it raises.
+    """
+    stdout = _thread_local_stdout()
+    previous = getattr(stdout.local, 'buffer', None)
+    stdout.local.buffer = buffer = StringIO()
+    diagnostics = []
+    try:
+        yield diagnostics
+    finally:
+        stdout.local.buffer = previous
+        if buffer.getvalue().strip():
+            diagnostics.append(Diagnostic(WARNING, buffer.getvalue().strip()))
@@ -0,0 +1,143 @@
+import time
+
+import clingo
+from clingo import ast
+
+import constants
+
+# the observer checks the deadline and the cancellation every CHECK_INTERVAL ground rules
+CHECK_INTERVAL = 10000
+
+
+class GroundingStopped(Exception):
+    pass
+
+
+class _Budget:
+    """Observer counting the ground rules, stopping the grounding when it exceeds the budget or the deadline."""
+
+    def __init__(self, max_rules: int, deadline: float, cancelled):
+        self.max_rules = max_rules
+        self.deadline = deadline
+        self.cancelled = cancelled
+        self.rules = 0
+
+    def rule(self, choice, head, body):
+        self.rules += 1
+        if self.rules > self.max_rules:
+            raise GroundingStopped()
+        if self.rules % CHECK_INTERVAL == 0 and (time.monotonic() > self.deadline or self.cancelled()):
+            raise GroundingStopped()
+
+    def weight_rule(self, choice, head, lower_bound, body):
+        self.rule(choice, head, body)
+
+    def disable(self):
+        self.max_rules = float('inf')
+        self.deadline = float('inf')
+        self.cancelled = lambda: False
+
+
+class _Predicates(ast.Transformer):
+    """Collects the predicates defined and used by statements, the conditions of the head being used."""
+
+    def __init__(self):
+        self.defined = set()
+        self.used = set()
+        self._target = self.used
+
+    def visit_SymbolicAtom(self, atom):
+        if atom.symbol.ast_type == ast.ASTType.Function:
+            self._target.add((atom.symbol.name, len(atom.symbol.arguments)))
+        return atom
+
+    def visit_ConditionalLiteral(self, literal):
+        self.visit(literal.literal)
+        target, self._target = self._target, self.used
+        self.visit_sequence(literal.condition)
+        self._target = target
+        return literal
+
+    def add(self, statement):
+        if statement.ast_type == ast.ASTType.Rule:
+            self._target = self.defined
+            self.visit(statement.head)
+            self._target = self.used
+            self.visit_sequence(statement.body)
+        elif statement.ast_type == ast.ASTType.Minimize:
+            self.visit_sequence(statement.body)
+
+
+def predicates(program: str) -> tuple[set, set]:
+    """Return the predicates defined and used by the rules of a program, as (name, arity) pairs."""
+    collector = _Predicates()
+    ast.parse_string(program, collector.add)
+    return collector.defined, collector.used
+
+
+def _groups(sections: list[tuple[str, str]]) -> list[list[int]]:
+    """Return the sections in groups, each group only using the predicates defined by itself and the previous ones."""
+    import networkx
+
+    section_predicates = [predicates(program) for _, program in sections]
+    graph = networkx.DiGraph()
+    graph.add_nodes_from(range(len(sections)))
+    definitions = {}
+    for i, (defined, _) in enumerate(section_predicates):
+        for predicate in defined:
+            definitions.setdefault(predicate, []).append(i)
+    for i, (_, used) in enumerate(section_predicates):
+        for predicate in used:
+            graph.add_edges_from((j, i) for j in definitions.get(predicate, []))
+    # the recursive sections are grounded together
+    components = networkx.condensation(graph)
+    return [sorted(components.nodes[node]['members']) for node in networkx.topological_sort(components)]
+
+
+def analyze(sections: list[tuple[str, str]], max_rules: int, deadline: float = float('inf'),
+            cancelled=lambda: False, instance: tuple[str, ...] = (), ctl: clingo.Control = None) -> dict:
+    """
+    Ground the rules of each section, labelled by the CNL statement or the rule they come from, within a budget.
+
+    The sections are grounded one after the other, following their dependencies, to count the ground rules and atoms
+    of each of them, after the batches of facts of the instance, if any. The grounding stops once it produces more
+    than max_rules rules, or after the deadline, and the counts are the ones reached so far. The sections with the
+    most ground rules are reported as the costly statements.
+
+    The sections are grounded in the given control, if any, so that it can be solved once the analysis is complete.
+    """
+    start = time.perf_counter()
+    if ctl is None:
+        ctl = clingo.Control(['--warn=none'])
+    budget = _Budget(max_rules, deadline, cancelled)
+    ctl.register_observer(budget)
+    groups = [('\n'.join(sections[i][0] for i in group), ['\n'.join(sections[i][1] for i in group)])
+              for group in _groups(sections)]
+    if instance:
+        groups.insert(0, ('Instance', instance))
+    for index, (_, programs) in enumerate(groups):
+        for program in programs:
+            ctl.add(f"group_{index}", [], program)
+    complete = True
+    counts = []
+    for index, (statement, _) in enumerate(groups):
+        rules = budget.rules
+        atoms = len(ctl.symbolic_atoms)
+        try:
+            ctl.ground([(f"group_{index}", [])])
+        except GroundingStopped:
+            complete = False
+        counts.append({'statement': statement, 'rules': budget.rules - rules,
+                       'atoms': len(ctl.symbolic_atoms) - atoms})
+        if not complete:
+            break
+    # the observer cannot be removed, the following groundings of the control are not limited
+    budget.disable()
+    counts.sort(key=lambda count: count['rules'], reverse=True)
+    return {
+        'complete': complete,
+        'atoms': len(ctl.symbolic_atoms),
+        'rules': budget.rules,
+        'statements': [count for count in counts[:constants.COSTLY_STATEMENTS] if count['rules']],
+        'time': time.perf_counter() - start,
+    }
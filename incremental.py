@@ -0,0 +1,258 @@
+import functools
+import os
+import threading
+
+import cnl2asp.cnl2asp
+from cnl2asp.converter.asp_converter import ASPConverter
+from cnl2asp.parser.parser import CNLTransformer
+from cnl2asp.specification.signaturemanager import SignatureManager
+from cnl2asp.utility.utility import Utility
+from lark import Lark, Tree
+
+import cache
+import constants
+
+PROBLEM_IDENTIFIER = "The following propositions"
+DEFINITIONS = ['explicit_definition_proposition', 'implicit_definition_proposition',
+               'constant_implicit_definition_proposition']
+
+statement_cache = cache.BoundedCache(constants.STATEMENT_CACHE_SIZE)
+# cnl2asp keeps the signatures and its options in class attributes, hence the compilations are serialized
+compile_lock = threading.RLock()
+
+
+@functools.cache
+def cnl_parser() -> Lark:
+    with open(os.path.join(os.path.dirname(cnl2asp.cnl2asp.__file__), "grammar.lark"), "r") as grammar:
+        return Lark(grammar.read(), propagate_positions=True)
+
+
+class Cnl2asp(cnl2asp.cnl2asp.Cnl2asp):
+    """Cnl2asp sharing a single Lark parser, parsing its input only once, and memoizing the ngo optimizations."""
+
+    def parse_input(self):
+        if not hasattr(self, '_tree'):
+            self._tree = cnl_parser().parse(self.cnl_input)
+        return self._tree
+
+    def optimize(self, asp_encoding: str, input_symbols: list = None, output_symbols: list = None,
+                 print_with_functions=False):
+        def predicates(symbols):
+            # ngo only depends on the predicates of the symbols
+            if symbols is not None:
+                return sorted({(symbol.predicate, symbol.get_arity(print_with_functions)) for symbol in symbols})
+
+        key = cache.digest('ngo', asp_encoding, predicates(input_symbols), predicates(output_symbols))
+        optimized_encoding = cache.optimization_cache.get(key)
+        if optimized_encoding is None:
+            optimized_encoding = super().optimize(asp_encoding, input_symbols, output_symbols, print_with_functions)
+            cache.optimization_cache.put(key, optimized_encoding)
+        return optimized_encoding
+
+
+class _SignatureReader(cnl2asp.cnl2asp.Cnl2asp):
+    """Returns the symbols of the signatures already registered, without compiling again."""
+
+    def compile(self, auto_link_entities: bool = True) -> str:
+        return ''
+
+
+class _StatementTransformer(CNLTransformer):
+    """CNLTransformer recording the propositions and signatures defined at the end of each statement."""
+
+    def __init__(self):
+        super().__init__()
+        self.boundaries = []
+
+    def END_OF_LINE(self, end_of_line):
+        self.boundaries.append((len(self._problem.get_propositions()), _signatures()))
+        return super().END_OF_LINE(end_of_line)
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _signatures():
+    return tuple((signature.get_name(), tuple(attribute.get_name() for attribute in signature.get_keys_and_attributes()))
+                 for signature in SignatureManager.signatures)
+
+
+def split_statements(cnl_input: str) -> list[str]:
+    """Split a CNL text on the full stops ending each statement, skipping strings and comments."""
+    statements = []
+    start = i = 0
+    quoted = False
+    while i < len(cnl_input):
+        char = cnl_input[i]
+        if quoted:
+            quoted = char != '"'
+        elif char == '"':
+            quoted = True
+        elif cnl_input.startswith('//', i):
+            i = cnl_input.find('\n', i)
+            if i == -1:
+                break
+        elif cnl_input.startswith('/*', i):
+            i = cnl_input.find('*/', i + 2)
+            if i == -1:
+                break
+            i += 1
+        elif char == '.' and not cnl_input[i + 1:i + 2].isdigit():
+            statements.append(cnl_input[start:i + 1])
+            start = i + 1
+        i += 1
+    if cnl_input[start:].strip():
+        statements.append(cnl_input[start:])
+    return statements
+
+
+def _parse(statement: str) -> Tree:
+    key = cache.digest('tree', statement)
+    tree = statement_cache.get(key)
+    if tree is None:
+        tree = cnl_parser().parse(statement)
+        statement_cache.put(key, tree)
+    return tree
+
+
+def _is_definition(tree: Tree) -> bool:
+    return any(isinstance(child, Tree) and child.data in DEFINITIONS for child in tree.children)
+
+
+def _assemble(trees: list[Tree]) -> Tree:
+    """Build the tree the parser would return for the concatenation of the given statements."""
+    definitions = []
+    propositions = []
+    for tree in trees:
+        if _is_definition(tree) and not propositions:
+            definitions += tree.children
+            continue
+        for child in tree.children:
+            if isinstance(child, Tree) and child.data == 'specification':
+                propositions += child.children
+            elif isinstance(child, Tree) and child.data == 'explicit_definition_proposition':
+                # definitions after the first proposition are rejected by the grammar
+                raise _Unsupported()
+            else:
+                propositions.append(child)
+    if propositions:
+        return Tree('start', definitions + [Tree('specification', propositions)])
+    return Tree('start', definitions)
+
+
+def _transform(trees: list[Tree]):
+    """Compile the given statements, returning the rules and the final signatures of each statement."""
+    SignatureManager.signatures = []
+    Utility.AUTO_ENTITY_LINK = True
+    transformer = _StatementTransformer()
+    specification = transformer.transform(_assemble(trees))
+    encoding = specification.convert(ASPConverter())
+    rules = [str(rule) for program in encoding._programs for rule in program._rules]
+    if len(transformer.boundaries) != len(trees) or \
+            len(rules) != (transformer.boundaries[-1][0] if transformer.boundaries else 0):
+        # some statements were not split correctly, or some rules are not bound to a proposition
+        # (e.g. the facts of temporal concepts)
+        raise _Unsupported()
+    constant_definitions = ''.join(f'#const {name} = {value}.\n' for name, value in encoding._constants if value)
+    return rules, transformer.boundaries, constant_definitions
+
+
+def _compile_definitions(definitions: list[Tree]):
+    rules, boundaries, constant_definitions = _transform(definitions)
+    symbols = _SignatureReader('').get_symbols()
+    statement_rules = []
+    start = 0
+    for end, _ in boundaries:
+        statement_rules.append(tuple(rules[start:end]))
+        start = end
+    return tuple(statement_rules), constant_definitions, tuple(symbols)
+
+
+def _compile_statement(definitions: list[Tree], statement: Tree):
+    rules, boundaries, _ = _transform(definitions + [statement])
+    before, signatures = boundaries[-2] if len(boundaries) > 1 else (0, ())
+    if boundaries[-1][1] != signatures:
+        # the statement defines new concepts, hence it is part of the definitions
+        return None
+    return tuple(rules[before:])
+
+
+def _compile_statements(cnl_input: str):
+    """Return the constant definitions, the rules of each statement and the symbols, or None."""
+    if PROBLEM_IDENTIFIER in cnl_input:
+        return None
+    try:
+        statements = []
+        trees = []
+        for statement in split_statements(cnl_input):
+            tree = _parse(statement.strip())
+            if tree.children:
+                statements.append(statement.strip())
+                trees.append(tree)
+        definitions = {i for i, tree in enumerate(trees)
+                       if _is_definition(tree) or statement_cache.get(cache.digest('defines', statements[i]))}
+        while True:
+            if definitions and max(definitions) >= len(definitions):
+                # a definition follows a proposition: the grammar rejects it, or it must be compiled in its place
+                return None
+            signature = cache.digest('definitions', Utility.PRINT_WITH_FUNCTIONS,
+                                     [statements[i] for i in sorted(definitions)])
+            compiled = statement_cache.get(signature)
+            if compiled is None:
+                compiled = _compile_definitions([trees[i] for i in sorted(definitions)])
+                statement_cache.put(signature, compiled)
+            definition_rules, constant_definitions, symbols = compiled
+            rules_of_statements = []
+            preceding = []
+            preceding_signature = cache.digest('statement', Utility.PRINT_WITH_FUNCTIONS)
+            for i, statement in enumerate(statements):
+                if i in definitions:
+                    rules_of_statements.append((statement, definition_rules[len(preceding)]))
+                    preceding.append(trees[i])
+                    preceding_signature = cache.digest(preceding_signature, statement)
+                    continue
+                key = cache.digest(preceding_signature, statement)
+                rules = statement_cache.get(key)
+                if rules is None:
+                    rules = _compile_statement(preceding, trees[i])
+                    if rules is None:
+                        statement_cache.put(cache.digest('defines', statement), True)
+                        definitions.add(i)
+                        break
+                    statement_cache.put(key, rules)
+                rules_of_statements.append((statement, rules))
+            else:
+                return constant_definitions, rules_of_statements, symbols
+    except Exception:
+        return None
+    finally:
+        SignatureManager.signatures = []
+
+
+def compile_statements(cnl_input: str):
+    """
+    Compile the CNL input statement by statement, reusing the ASP of the statements already compiled.
+
+    The ASP of each statement is cached by the statement text and the concept definitions preceding it,
+    so that an edit only recompiles the modified statements as long as the definitions do not change.
+    Returns the encoding and the symbols, or None if the input must be compiled as a whole.
+    """
+    compiled = _compile_statements(cnl_input)
+    if compiled is None:
+        return None
+    constant_definitions, rules_of_statements, symbols = compiled
+    encoding = [constant_definitions]
+    for _, rules in rules_of_statements:
+        encoding += rules
+    return ''.join(encoding).strip() + '\n', symbols
+
+
+def statement_rules(cnl_input: str):
+    """Return the CNL statements with their ASP rules, the constant definitions first, or None as compile_statements."""
+    compiled = _compile_statements(cnl_input)
+    if compiled is None:
+        return None
+    constant_definitions, rules_of_statements, _ = compiled
+    sections = [(statement, ''.join(rules)) for statement, rules in rules_of_statements]
+    return [('Constants', constant_definitions)] + sections if constant_definitions else sections
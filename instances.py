@@ -0,0 +1,103 @@
+import csv
+import io
+import os
+import re
+from typing import NamedTuple
+
+import cache
+import constants
+import uploads
+
+# the integers written as clingo prints them, the other values are quoted
+INTEGER = re.compile(r'-?(0|[1-9]\d*)')
+# the strings and the comments, in which the periods do not end the statements, and the periods ending them, with
+# the weight of the weak constraints
+TOKENS = re.compile(r'"(?:[^"\\]|\\.)*"|%\*.*?\*%|%[^\n]*|\.\.|\.(?:\s*\[[^\]]*\])?', re.DOTALL)
+
+
+class Instance(NamedTuple):
+    """The facts paired with an encoding, in batches of constants.INSTANCE_BATCH_SIZE statements."""
+    key: str
+    name: str
+    batches: tuple[str, ...]
+    statements: int
+
+
+def _term(value: str) -> str:
+    value = value.strip()
+    if INTEGER.fullmatch(value):
+        return value
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+
+def _csv_batches(text: str, predicate: str) -> tuple[list[str], int]:
+    """Convert the rows of a CSV text, after its header, to facts of the given predicate."""
+    batches = []
+    batch = []
+    statements = 0
+    rows = csv.reader(io.StringIO(text))
+    next(rows, None)
+    for row in rows:
+        if not row:
+            continue
+        batch.append(f"{predicate}({','.join(_term(value) for value in row)}).")
+        statements += 1
+        if len(batch) == constants.INSTANCE_BATCH_SIZE:
+            batches.append('\n'.join(batch))
+            batch = []
+    if batch:
+        batches.append('\n'.join(batch))
+    return batches, statements
+
+
+def _lp_batches(text: str) -> tuple[list[str], int]:
+    """
+    Split a program in batches of statements, without parsing it.
+
+    The batches are only cut after the periods ending the statements, outside the strings and the comments.
+    """
+    batches = []
+    statements = 0
+    start = 0
+    for token in TOKENS.finditer(text):
+        if token.group()[0] != '.' or token.group() == '..':
+            continue
+        statements += 1
+        if statements % constants.INSTANCE_BATCH_SIZE == 0:
+            batches.append(text[start:token.end()])
+            start = token.end()
+    if text[start:].strip():
+        batches.append(text[start:])
+    return batches, statements
+
+
+def predicate_name(file_name: str) -> str:
+    """Return the predicate of the facts of a CSV file, from its name."""
+    predicate = re.sub(r'\W+', '_', os.path.splitext(os.path.basename(file_name))[0]).strip('_').lower()
+    if not predicate or not predicate[0].isalpha():
+        raise uploads.UploadError(f"{file_name} is not a valid predicate name for its facts.")
+    return predicate
+
+
+def read_instance(uploaded_file) -> Instance:
+    """
+    Read the facts of an uploaded .lp or CSV file, the rows of a CSV file after its header being facts of the
+    predicate named after the file.
+
+    The instances are cached by content, independently of the encodings they are solved with.
+    """
+    is_csv = uploaded_file.name.lower().endswith('.csv')
+    predicate = predicate_name(uploaded_file.name) if is_csv else None
+    key = cache.digest('instance', uploads.upload_digest(uploaded_file), predicate)
+    instance = cache.instance_cache.get(key)
+    if instance is not None:
+        return instance._replace(name=uploaded_file.name)
+    # the text is not kept in the cache of the uploads, since the batches already hold it
+    text = uploads.decode_upload(uploaded_file)
+    try:
+        batches, statements = _csv_batches(text, predicate) if is_csv else _lp_batches(text)
+    except csv.Error as e:
+        raise uploads.UploadError(f"{uploaded_file.name} is not a valid CSV file: {e}.")
+    instance = Instance(key, uploaded_file.name, tuple(batches), statements)
+    cache.instance_cache.put(key, instance)
+    return instance
@@ -0,0 +1,32 @@
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+
+def peak_rss() -> int:
+    """Return the peak resident set size of the current process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on linux and in bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Profiler:
+    """Collects the wall time spent in each phase of a single script rerun."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases: dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - start
+
+    def report(self) -> dict:
+        phases = {name: round(elapsed, 6) for name, elapsed in self.phases.items()}
+        phases['rerun'] = round(time.perf_counter() - self.start, 6)
+        return {'phases': phases, 'peak_rss': peak_rss()}
@@ -0,0 +1,162 @@
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import constants
+
+# the pages are opened with the state of the link in STATE, or with the id of a short link in SHORT_LINK
+STATE = 's'
+SHORT_LINK = 'l'
+VERSION = 1
+STORED = 0
+DEFLATE = 1
+# the vocabulary of the CNL, of ASP and of the state of the pages, the most frequent strings last, since they are
+# the cheapest to reference. The links of a version are decoded with its dictionary, hence it must never change:
+# a new dictionary needs a new version
+DICTIONARIES = {
+    1: ''.join([
+        'telingo', 'horizon', '#maximize{', '#minimize{', '#count{', '#sum{', '#const ', '#show ', '#external ',
+        'is a temporal concept expressed in', 'minutes', 'days', 'ranging from', 'The following propositions ',
+        'apply in the initial state:', 'always apply except in the initial state:', 'apply in the final state:',
+        'previously ', 'eventually ', 'next ', 'is preferred, with high priority, that ', 'medium priority', 'low priority',
+        'is maximized.', 'is minimized.', 'the number of ', 'the total of ', 'is greater than ', 'is less than ',
+        'is different from ', 'is equal to ', 'at most ', 'at least ', 'exactly ', 'goes from ', 'is one of ',
+        'It is prohibited that ', 'It is required that ', 'then we must have ', 'then we can have ',
+        'Whenever there is not ', 'Whenever there is ', 'is identified by ', 'and has a ', ', and has ', 'with id ',
+        'an id', ' with ', ' a ', ' an ', '. ', ' :- ', ':- ', ' not ', '), ', ').\n', '(X,Y)', '(X)', ' X ',
+        '{"definitions":"', '{"asp_output":"', '"selected_symbols":[', '"optimize":false,', '"run_solver":false,',
+        '"run_solver":true,', '{"cnl_statements":"', '.\\n', ' is ', ' the ', 'A ',
+    ]).encode(),
+}
+
+
+def _encode_frame(state: dict) -> bytes:
+    data = json.dumps(state, separators=(',', ':')).encode()
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=DICTIONARIES[VERSION])
+    compressed = compressor.compress(data) + compressor.flush()
+    if len(compressed) < len(data):
+        return bytes([VERSION, DEFLATE]) + compressed
+    return bytes([VERSION, STORED]) + data
+
+
+def _decode_frame(frame: bytes) -> dict:
+    if len(frame) < 2 or frame[0] not in DICTIONARIES:
+        raise ValueError('Unknown link format.')
+    if frame[1] == DEFLATE:
+        decompressor = zlib.decompressobj(-15, zdict=DICTIONARIES[frame[0]])
+        data = decompressor.decompress(frame[2:]) + decompressor.flush()
+    elif frame[1] == STORED:
+        data = frame[2:]
+    else:
+        raise ValueError('Unknown link compression.')
+    state = json.loads(data)
+    if not isinstance(state, dict):
+        raise ValueError('The link does not hold the state of a page.')
+    return state
+
+
+def encode(state: dict) -> str:
+    """Encode the state of a page in a compact string for the query of a url."""
+    return base64.urlsafe_b64encode(_encode_frame(state)).rstrip(b'=').decode()
+
+
+def decode(value: str) -> dict:
+    return _decode_frame(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)))
+
+
+def decode_legacy(value: str) -> dict:
+    """Decode the links generated with dumbo_utils.url.compress_object_for_url, before the current format."""
+    # the + of the base64 encoding become spaces if the url is not quoted
+    decompressed = zlib.decompress(base64.b64decode(value.removesuffix("!").replace(" ", "+")))
+    return json.loads(base64.b64decode(decompressed).decode())
+
+
+class LinkStore:
+    """The frames of the short links, in a SQLite file, identified by a hash of their content."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS links (id TEXT PRIMARY KEY, frame BLOB, created REAL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite connections cannot be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def put(self, frame: bytes) -> str:
+        link_id = base64.urlsafe_b64encode(hashlib.blake2b(frame, digest_size=9).digest()).decode()
+        with self._connection() as connection:
+            connection.execute("INSERT OR IGNORE INTO links VALUES (?, ?, ?)", (link_id, frame, time.time()))
+        return link_id
+
+    def get(self, link_id: str) -> bytes:
+        with self._connection() as connection:
+            row = connection.execute("SELECT frame FROM links WHERE id = ?", (link_id,)).fetchone()
+        return None if row is None else row[0]
+
+
+_link_store = None
+_link_store_lock = threading.Lock()
+
+
+def get_link_store() -> LinkStore:
+    """Return the store of the short links, or None if constants.SHORT_LINKS_PATH is not set."""
+    global _link_store
+    if constants.SHORT_LINKS_PATH is None:
+        return None
+    with _link_store_lock:
+        if _link_store is None:
+            os.makedirs(os.path.dirname(os.path.abspath(constants.SHORT_LINKS_PATH)), exist_ok=True)
+            _link_store = LinkStore(constants.SHORT_LINKS_PATH)
+        return _link_store
+
+
+def share(page: str, state: dict) -> str:
+    """
+    Return the url opening the given page with the given state.
+
+    The state is in the url, unless the url would be longer than constants.LINK_LENGTH_LIMIT and the short links are
+    enabled: in that case it is saved in their store, and the url only holds its id.
+    """
+    url = f"{constants.APP_URL}{page}?{STATE}={encode(state)}"
+    link_store = get_link_store()
+    if len(url) > constants.LINK_LENGTH_LIMIT and link_store is not None:
+        url = f"{constants.APP_URL}{page}?{SHORT_LINK}={link_store.put(_encode_frame(state))}"
+    return url
+
+
+def shared_state(query_params, legacy_params: list[str] = ()) -> dict:
+    """
+    Return the state in the link opening a page, merging the objects of the legacy_params of the old links.
+
+    The parts of the link that cannot be decoded are ignored.
+    """
+    state = {}
+    try:
+        if SHORT_LINK in query_params:
+            link_store = get_link_store()
+            frame = link_store.get(query_params[SHORT_LINK]) if link_store is not None else None
+            if frame is not None:
+                state.update(_decode_frame(frame))
+        elif STATE in query_params:
+            state.update(decode(query_params[STATE]))
+    except (ValueError, zlib.error, sqlite3.Error):
+        pass
+    for param in legacy_params:
+        if param in query_params:
+            try:
+                state.update(decode_legacy(query_params[param]))
+            except (ValueError, TypeError, zlib.error):
+                pass
+    return state
@@ -0,0 +1,87 @@
+import threading
+import time
+from typing import Iterator
+
+import cache
+import constants
+
+SYSTEM_PROMPT = ("You are a helpful assistant which explains the problems provided improving the writing style and "
+                 "clarity.\nIn your response I just want the rewritten text.")
+
+
+class ModelsUnavailable(Exception):
+    pass
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key: str, base_url: str = None):
+    """Return the Groq client shared by all the sessions, so that its connections are reused."""
+    from groq import Groq
+    with _clients_lock:
+        if (api_key, base_url) not in _clients:
+            # the rate limits are handled by moving to the next model, instead of retrying
+            _clients[(api_key, base_url)] = Groq(api_key=api_key, base_url=base_url, max_retries=0)
+        return _clients[(api_key, base_url)]
+
+
+# the rate limits are shared by all the sessions, since they depend on the api key
+_suspended_until = {}
+_suspended_lock = threading.Lock()
+
+
+def available_models() -> list[str]:
+    """Return the models not suspended after a failure, in order of preference."""
+    now = time.monotonic()
+    with _suspended_lock:
+        return [model for model in constants.LLM_MODELS if _suspended_until.get(model, 0) <= now]
+
+
+def _suspend(model: str, seconds: float):
+    with _suspended_lock:
+        _suspended_until[model] = max(_suspended_until.get(model, 0), time.monotonic() + seconds)
+
+
+def _retry_after(error) -> float:
+    try:
+        return float(error.response.headers['retry-after'])
+    except (KeyError, TypeError, ValueError):
+        return constants.LLM_RATE_LIMIT_BACKOFF
+
+
+def improve_clarity(client, cnl: str) -> Iterator[str]:
+    """
+    Yield the rewriting of the CNL by the first available model, as it is generated.
+
+    The rewritings are cached by model and text. A model exceeding its rate limit is skipped until the time
+    requested by the server, and a model failing otherwise for constants.LLM_FAILURE_BACKOFF seconds.
+    Raises ModelsUnavailable if no model can be used.
+    """
+    import groq
+    for model in constants.LLM_MODELS:
+        cached = cache.llm_cache.get(cache.digest('llm', model, cnl))
+        if cached is not None:
+            yield cached
+            return
+    for model in available_models():
+        chunks = []
+        try:
+            stream = client.chat.completions.create(
+                messages=[{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": cnl}],
+                model=model, temperature=0.5, max_completion_tokens=1024, top_p=1, stop=None, stream=True)
+            for chunk in stream:
+                content = chunk.choices[0].delta.content if chunk.choices else None
+                if content:
+                    chunks.append(content)
+                    yield content
+        except groq.APIStatusError as e:
+            # the part already shown cannot be completed by another model
+            if chunks:
+                raise
+            _suspend(model, _retry_after(e) if isinstance(e, groq.RateLimitError) else constants.LLM_FAILURE_BACKOFF)
+            continue
+        cache.llm_cache.put(cache.digest('llm', model, cnl), ''.join(chunks))
+        return
+    raise ModelsUnavailable('LLM rate limit exceeded, please try again later!')
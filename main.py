@@ -1,6 +1,9 @@
 import streamlit as st
 import streamlit.components.v1 as components
 
+import metrics
+import startup
+
 
 def documentation():
     st.set_page_config(page_title="Documentation",
@@ -9,6 +12,8 @@ def documentation():
     components.iframe(iframe_src, height=800, scrolling=True)
 
 
+startup.start_warm_up()
+metrics.start_server()
 pg = st.navigation([
     st.Page("pages/cnl2aspui.py", title="CNL2ASP"),
     st.Page("pages/asp2cnlui.py", title="ASP2CNL"),
@@ -0,0 +1,224 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cache
+import constants
+import instrumentation
+import pool
+
+PREFIX = 'cnl2asp_'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _sample(name: str, labels: dict, value) -> str:
+    if labels:
+        name += '{' + ','.join(f'{label}="{_escape(label_value)}"' for label, label_value in labels.items()) + '}'
+    return f"{name} {value}"
+
+
+class Counter:
+    """A counter for each combination of the values of its labels."""
+    kind = 'counter'
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        self.name = PREFIX + name
+        self.description = description
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *values, amount: float = 1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [_sample(self.name, dict(zip(self.labels, labels)), value) for labels, value in values]
+
+
+class Histogram:
+    """The distribution of the values observed for each combination of the values of its labels."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = constants.METRICS_BUCKETS):
+        self.name = PREFIX + name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *values):
+        with self._lock:
+            counts, total = self._values.get(values, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[values] = counts, total + value
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        samples = []
+        for labels, counts, total in values:
+            labels = dict(zip(self.labels, labels))
+            cumulative = 0
+            for bound, count in zip([*self.buckets, '+Inf'], counts):
+                cumulative += count
+                samples.append(_sample(f"{self.name}_bucket", {**labels, 'le': bound}, cumulative))
+            samples.append(_sample(f"{self.name}_sum", labels, total))
+            samples.append(_sample(f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class Collected:
+    """A metric whose values are read when the metrics are served, from a function returning (labels, value) pairs."""
+
+    def __init__(self, name: str, description: str, kind: str, labels: tuple[str, ...], collect):
+        self.name = PREFIX + name
+        self.description = description
+        self.kind = kind
+        self.labels = labels
+        self.collect = collect
+        _registry.append(self)
+
+    def samples(self) -> list[str]:
+        return [_sample(self.name, dict(zip(self.labels, labels)), value) for labels, value in self.collect()]
+
+
+def _caches() -> dict:
+    return {name: value.stats() for name, value in vars(cache).items() if isinstance(value, cache.BoundedCache)}
+
+
+def _pool_state(attribute: str) -> list:
+    started = pool.started_pool()
+    return [] if started is None else [((), getattr(started, attribute))]
+
+
+# the size of the state of the sessions, with the last time it was measured
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _session_sizes() -> list[int]:
+    now = time.monotonic()
+    with _sessions_lock:
+        for session_id in [key for key, (_, seen) in _sessions.items() if now - seen > constants.METRICS_SESSION_TTL]:
+            del _sessions[session_id]
+        return [size for size, _ in _sessions.values()]
+
+
+def _session_state_bytes() -> list:
+    sizes = _session_sizes()
+    return [(('sum',), sum(sizes)), (('max',), max(sizes, default=0))]
+
+
+durations = Histogram('operation_duration_seconds', 'Duration of the operations of the pages.', ('mode', 'operation'))
+errors = Counter('operation_errors_total', 'Operations of the pages that failed.', ('mode', 'operation'))
+solver_results = Counter('solver_results_total', 'Results of the solver jobs run by the pool.', ('solver', 'status'))
+solver_durations = Histogram('solver_duration_seconds', 'Time from the submission of the solver jobs to their result.',
+                             ('solver',))
+Collected('cache_hits_total', 'Hits of the caches, in memory or in the persistent store.', 'counter',
+          ('cache', 'source'), lambda: [((name, source), stats[key]) for name, stats in _caches().items()
+                                        for source, key in [('memory', 'hits'), ('store', 'stored_hits')]])
+Collected('cache_misses_total', 'Misses of the caches.', 'counter', ('cache',),
+          lambda: [((name,), stats['misses']) for name, stats in _caches().items()])
+Collected('cache_bytes', 'Approximate size of the values held by the caches.', 'gauge', ('cache',),
+          lambda: [((name,), stats['bytes']) for name, stats in _caches().items()])
+Collected('pool_queued_jobs', 'Solver jobs waiting for a worker.', 'gauge', (), lambda: _pool_state('queued'))
+Collected('pool_busy_workers', 'Workers running a solver job.', 'gauge', (), lambda: _pool_state('busy'))
+Collected('sessions', 'Sessions seen in the last METRICS_SESSION_TTL seconds.', 'gauge', (),
+          lambda: [((), len(_session_sizes()))])
+Collected('session_state_bytes', 'Total and largest approximate size of the state of the recent sessions.', 'gauge',
+          ('statistic',), _session_state_bytes)
+Collected('peak_rss_bytes', 'Peak resident set size of the server process.', 'gauge', (),
+          lambda: [((), instrumentation.peak_rss())])
+
+
+@contextmanager
+def timed(mode: str, operation: str):
+    """Measure the duration of an operation, counting an error if it raises. Can also decorate a function."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        errors.inc(mode, operation)
+        raise
+    finally:
+        durations.observe(time.perf_counter() - start, mode, operation)
+
+
+def observe_session():
+    """Measure the size of the state of the current session, at most every constants.METRICS_SESSION_INTERVAL seconds."""
+    import streamlit as st
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    context = get_script_run_ctx()
+    if context is None:
+        return
+    now = time.monotonic()
+    with _sessions_lock:
+        last = _sessions.get(context.session_id)
+        if last is not None and now - last[1] < constants.METRICS_SESSION_INTERVAL:
+            return
+    size = cache.sizeof(st.session_state.to_dict())
+    with _sessions_lock:
+        _sessions[context.session_id] = size, now
+
+
+def exposition() -> str:
+    """Return the metrics in the text format of Prometheus."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = exposition().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server_started = False
+_server_lock = threading.Lock()
+
+
+def start_server():
+    """Serve the metrics once per server process, in the background, if enabled in constants.METRICS_PORT."""
+    global _server_started
+    with _server_lock:
+        if constants.METRICS_PORT is None or _server_started:
+            return
+        _server_started = True
+        try:
+            server = ThreadingHTTPServer((constants.METRICS_HOST, constants.METRICS_PORT), _Handler)
+        except OSError:
+            # the port is taken, by another server process of the host for example
+            return
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
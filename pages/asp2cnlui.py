@@ -1,17 +1,13 @@
-import base64
-import zlib
-from io import StringIO
-
-import groq
-from asp2cnl.compiler import compile_rule
-from asp2cnl.parser import ASPParser
-from cnl2asp.cnl2asp import Cnl2asp
 import streamlit as st
-from groq import Groq
 
 import constants
-import json
-import dumbo_utils.url as dumbo
+import conversion
+import diagnostics
+import links
+import llm
+import metrics
+import uploads
+import views
 
 height = 400
 
@@ -32,25 +28,11 @@ def init():
     if constants.LINK not in st.session_state:
         st.session_state[constants.LINK] = ""
 
-    if "asp" in st.query_params:
-        try:
-            decompressed = zlib.decompress(base64.b64decode(st.query_params["asp"].removesuffix("!").replace(" ", "+")))
-            json_obj = json.loads(base64.b64decode(decompressed).decode())
-            for element in [constants.ASP_ENCODING]:
-                if element in json_obj:
-                    st.session_state[element] = json_obj[element]
-        except Exception as e:
-            pass
-
-    if "def" in st.query_params:
-        try:
-            decompressed = zlib.decompress(base64.b64decode(st.query_params["def"].removesuffix("!").replace(" ", "+")))
-            json_obj = json.loads(base64.b64decode(decompressed).decode())
-            for element in [constants.DEFINITIONS]:
-                if element in json_obj:
-                    st.session_state[element] = json_obj[element]
-        except Exception as e:
-            pass
+    # the links generated before the current format have the encoding and the definitions in separate parameters
+    shared_state = links.shared_state(st.query_params, ["asp", "def"])
+    for element in [constants.ASP_ENCODING, constants.DEFINITIONS]:
+        if element in shared_state:
+            st.session_state[element] = shared_state[element]
     st.query_params.clear()
 
 
@@ -59,56 +41,36 @@ def reset():
     st.session_state[constants.ERROR] = None
 
 
-def get_cnl():
-    try:
-        cnl = ''
-        symbols = Cnl2asp(st.session_state[constants.DEFINITIONS]).get_symbols()
-        encoding = ASPParser(st.session_state[constants.ASP_ENCODING] + '\n').parse()
-        i = 0
-        for rule in encoding:
-            cnl += f'{compile_rule(rule, symbols)}\n'
-            i += 1
-        return True, cnl
-    except Exception as e:
-        return False, str(e)
-
-
-def convert_asp():
+@metrics.timed('asp2cnl', 'get_cnl')
+def convert_asp(placeholder):
     if not st.session_state[constants.ASP_ENCODING] or \
             st.session_state[constants.ASP_ENCODING].strip() == "":
         return
     reset()
-    result, message = get_cnl()
-    if result:
-        st.session_state[constants.CNL_STATEMENTS] = message
-    else:
-        st.session_state[constants.ERROR] = message
+    cnl = []
+    try:
+        # the translation is shown while it proceeds, since large encodings take a while
+        for translation in conversion.translate_rules(st.session_state[constants.ASP_ENCODING],
+                                                      st.session_state[constants.DEFINITIONS], parallel=True):
+            cnl.append(f'{translation}\n')
+            if len(cnl) % constants.TRANSLATION_CHUNK_SIZE == 0:
+                placeholder.code(''.join(cnl), language='markdown')
+        st.session_state[constants.CNL_STATEMENTS] = ''.join(cnl)
+    except Exception as e:
+        st.session_state[constants.ERROR] = str(diagnostics.from_exception(e))
+        metrics.errors.inc('asp2cnl', 'get_cnl')
+    placeholder.empty()
 
 
 def generate_shareable_link():
     if st.session_state[constants.ASP_ENCODING].strip() == "" and st.session_state[constants.DEFINITIONS].strip() == "":
         return
-    compressed_definitions = None
-    compressed_asp = None
+    shared_state = {}
     if st.session_state[constants.DEFINITIONS].strip() != "":
-        compressed_definitions = dumbo.compress_object_for_url(
-            {
-                constants.DEFINITIONS: f"{st.session_state[constants.DEFINITIONS]}",
-            }
-        )
+        shared_state[constants.DEFINITIONS] = st.session_state[constants.DEFINITIONS]
     if st.session_state[constants.ASP_ENCODING]:
-        compressed_asp = dumbo.compress_object_for_url(
-            {
-                constants.ASP_ENCODING: f"{st.session_state[constants.ASP_ENCODING]}",
-            }
-        )
-    st.session_state[constants.LINK] = f"https://cnl2asp.streamlit.app/asp2cnlui?"
-    if compressed_definitions is not None and compressed_asp is not None:
-        st.session_state[constants.LINK] += f"asp={compressed_asp}&def={compressed_definitions}"
-    elif compressed_definitions is not None:
-        st.session_state[constants.LINK] += f"def={compressed_definitions}"
-    else:
-        st.session_state[constants.LINK] += f"asp={compressed_asp}"
+        shared_state[constants.ASP_ENCODING] = st.session_state[constants.ASP_ENCODING]
+    st.session_state[constants.LINK] = links.share("/asp2cnlui", shared_state)
 
 
 def updated_asp_area():
@@ -120,85 +82,44 @@ def updated_definitions():
     st.session_state[constants.DEFINITIONS] = st.session_state.definitions
 
 
-def call_groq_llm():
-    models = ['llama-3.3-70b-versatile', 'distil-whisper-large-v3-en', 'gemma2-9b-it', 'llama-3.1-8b-instant',
-              'llama-guard-3-8b', 'llama3-70b-8192', 'llama3-8b-8192', 'mixtral-8x7b-32768', 'whisper-large-v3',
-              'whisper-large-v3-turbo']
-    while constants.ASP2NL_MODEL < len(models):
+@metrics.timed('asp2cnl', 'call_groq_llm')
+def improve_clarity(placeholder):
+    text = ''
+    try:
+        client = llm.get_client(st.secrets["groq_api_key"], st.secrets.get("groq_base_url"))
+        # the rewriting is shown while it is generated
+        for chunk in llm.improve_clarity(client, st.session_state[constants.CNL_STATEMENTS]):
+            text += chunk
+            placeholder.code(text, language='markdown')
+    except llm.ModelsUnavailable:
+        metrics.errors.inc('asp2cnl', 'call_groq_llm')
+        st.session_state[constants.CNL_STATEMENTS] = None
+        st.session_state[constants.ERROR] = 'LLM rate limit exceeded, please try to refresh the page and if still ' \
+                                            'doesn\'t work try again later!'
+    except Exception as e:
+        metrics.errors.inc('asp2cnl', 'call_groq_llm')
+        placeholder.error(str(e))
+        return
+    else:
+        st.session_state[constants.CNL_STATEMENTS] = text
+    st.rerun()
+
+
+def read_file(uploader, element):
+    if st.session_state[uploader] is not None:
         try:
-            client = Groq(
-                api_key=st.secrets["groq_api_key"],
-            )
-            result = client.chat.completions.create(
-                #
-                # Required parameters
-                #
-                messages=[
-                    # Set an optional system message. This sets the behavior of the
-                    # assistant and can be used to provide specific instructions for
-                    # how it should behave throughout the conversation.
-                    {
-                        "role": "system",
-                        "content": "You are a helpful assistant which explains the problems provided improving the writing style and clarity.\n"
-                                   "In your response I just want the rewritten text."
-                    },
-                    # Set a user message for the assistant to respond to.
-                    {
-                        "role": "user",
-                        "content": f"{st.session_state[constants.CNL_STATEMENTS]}",
-                    }
-                ],
-
-                # The language model which will generate the completion.
-                model=models[constants.ASP2NL_MODEL],
-
-                #
-                # Optional parameters
-                #
-
-                # Controls randomness: lowering results in less random completions.
-                # As the temperature approaches zero, the model will become deterministic
-                # and repetitive.
-                temperature=0.5,
-
-                # The maximum number of tokens to generate. Requests can use up to
-                # 32,768 tokens shared between prompt and completion.
-                max_completion_tokens=1024,
-
-                # Controls diversity via nucleus sampling: 0.5 means half of all
-                # likelihood-weighted options are considered.
-                top_p=1,
-
-                # A stop sequence is a predefined or user-specified text string that
-                # signals an AI to stop generating content, ensuring its responses
-                # remain focused and concise. Examples include punctuation marks and
-                # markers like "[end]".
-                stop=None,
-
-                # If set, partial message deltas will be sent.
-                stream=False,
-            )
-            st.session_state[constants.CNL_STATEMENTS] = result.choices[0].message.content
-            return
-        except:
-            constants.ASP2NL_MODEL += 1
-    st.session_state[constants.CNL_STATEMENTS] = None
-    st.session_state[
-        constants.ERROR] = 'LLM rate limit exceeded, please try to refresh the page and if still doesn\'t work try again tomorrow!'
+            st.session_state[element] = uploads.read_upload(st.session_state[uploader])
+        except uploads.UploadError as e:
+            reset()
+            st.session_state[constants.ERROR] = str(e)
 
 
 def read_asp_file():
-    if st.session_state.asp_uploader is not None:
-        stringio = StringIO(st.session_state.asp_uploader.getvalue().decode("utf-8"))
-        string_data = stringio.read()
-        st.session_state[constants.ASP_ENCODING] = string_data
+    read_file('asp_uploader', constants.ASP_ENCODING)
 
 
 def read_definitions_file():
-    if st.session_state.definitions_uploader is not None:
-        stringio = StringIO(st.session_state.definitions_uploader.getvalue().decode("utf-8"))
-        string_data = stringio.read()
-        st.session_state[constants.DEFINITIONS] = string_data
+    read_file('definitions_uploader', constants.DEFINITIONS)
 
 
 init()
@@ -212,18 +133,26 @@ definition_title, import_definitions = asp_column.columns(2)
 import_definitions.file_uploader("Upload concept definitions", key='definitions_uploader',
                                  on_change=read_definitions_file)
 definition_title.header("CNL Concepts")
-asp_column.text_area("Insert here the concept definitions", key="definitions", on_change=updated_definitions,
-                     height=int(height / 2), max_chars=None, value=st.session_state[constants.DEFINITIONS],
-                     placeholder="A movie is identified by an id, and has a name, and a duration.")
+if len(st.session_state[constants.DEFINITIONS] or '') > constants.EDITOR_SIZE_LIMIT:
+    views.windowed_code(asp_column, st.session_state[constants.DEFINITIONS], 'definitions_window')
+    asp_column.caption("The definitions are too large to be edited here, upload the edited file instead.")
+else:
+    asp_column.text_area("Insert here the concept definitions", key="definitions", on_change=updated_definitions,
+                         height=int(height / 2), max_chars=None, value=st.session_state[constants.DEFINITIONS],
+                         placeholder="A movie is identified by an id, and has a name, and a duration.")
 
 asp_title, import_asp = asp_column.columns(2)
 asp_title.header("ASP")
 import_asp.file_uploader("Upload ASP encoding", key='asp_uploader', on_change=read_asp_file)
 
-asp_column.text_area("Insert here your ASP encoding", key="asp", on_change=updated_asp_area,
-                     height=height, max_chars=None, value=st.session_state[constants.ASP_ENCODING],
-                     placeholder="movie(1, \"Forrest Gump\", 142).")
-asp_column.button(label="Convert", on_click=convert_asp, help="Convert ASP rules to CNL")
+if len(st.session_state[constants.ASP_ENCODING] or '') > constants.EDITOR_SIZE_LIMIT:
+    views.windowed_code(asp_column, st.session_state[constants.ASP_ENCODING], 'asp_input_window', language='prolog')
+    asp_column.caption("The encoding is too large to be edited here, upload the edited file instead.")
+else:
+    asp_column.text_area("Insert here your ASP encoding", key="asp", on_change=updated_asp_area,
+                         height=height, max_chars=None, value=st.session_state[constants.ASP_ENCODING],
+                         placeholder="movie(1, \"Forrest Gump\", 142).")
+convert = asp_column.button(label="Convert", help="Convert ASP rules to CNL")
 
 generate_link, link_area = asp_column.columns([1, 4])
 generate_link.button(label="Generate link", on_click=generate_shareable_link,
@@ -231,15 +160,21 @@ generate_link.button(label="Generate link", on_click=generate_shareable_link,
 link_area.code(st.session_state[constants.LINK], line_numbers=False)
 
 res_column.header("CNL")
+if convert:
+    convert_asp(res_column.empty())
 if st.session_state[constants.CNL_STATEMENTS] is not None:
     st.markdown('''<style> code {
               white-space : pre-wrap !important;
             } </style>''', unsafe_allow_html=True)
-    res_column.code(st.session_state[constants.CNL_STATEMENTS], language='markdown')
+    views.windowed_code(res_column, st.session_state[constants.CNL_STATEMENTS], 'result_window', language='markdown')
     download, improve = res_column.columns(2)
     download.download_button("Download", str(st.session_state[constants.CNL_STATEMENTS]),
                              file_name='cnl.txt', help="Download result")
-    improve.button(label='Improve Clarity', on_click=call_groq_llm,
-                   help="Improve clarity of CNL by calling an external LLM. Note: This might generate inaccurate results!")
+    improve_button = improve.button(label='Improve Clarity',
+                                    help="Improve clarity of CNL by calling an external LLM. "
+                                         "Note: This might generate inaccurate results!")
+    if improve_button:
+        improve_clarity(res_column.empty())
 elif st.session_state[constants.ERROR] is not None:
     res_column.error(st.session_state[constants.ERROR])
+metrics.observe_session()
@@ -1,17 +1,21 @@
-import base64
+import math
 import uuid
-import zlib
-from io import StringIO
 
-import clingo
-from cnl2asp.cnl2asp import Cnl2asp
-import sys
 import streamlit as st
 import json
 import dumbo_utils.url as dumbo
-from cnl2asp.utility.utility import Utility
 
+import cache
 import constants
+import conversion
+import diagnostics
+import instances
+import instrumentation
+import links
+import metrics
+import solver
+import uploads
+import views
 
 height = 400
 
@@ -44,17 +48,46 @@ def init():
     if constants.SELECTED_SYMBOLS not in st.session_state:
         st.session_state[constants.SELECTED_SYMBOLS] = []
 
-    if "cnl" in st.query_params:
-        try:
-            decompressed = zlib.decompress(base64.b64decode(st.query_params["cnl"].removesuffix("!").replace(" ", "+")))
-            json_obj = json.loads(base64.b64decode(decompressed).decode())
-            for element in [constants.CNL_STATEMENTS, constants.RUN_SOLVER, constants.OPTIMIZE,
-                            constants.SELECTED_SYMBOLS]:
-                if element in json_obj:
-                    st.session_state[element] = json_obj[element]
-            st.query_params.clear()
-        except Exception as e:
-            pass
+    if constants.TIME_LIMIT not in st.session_state:
+        st.session_state[constants.TIME_LIMIT] = 10
+
+    if constants.SOLVE_JOB not in st.session_state:
+        st.session_state[constants.SOLVE_JOB] = None
+
+    if constants.INSTANCE not in st.session_state:
+        st.session_state[constants.INSTANCE] = None
+
+    if constants.MODELS not in st.session_state:
+        st.session_state[constants.MODELS] = 1
+
+    if constants.OPTIMAL_ONLY not in st.session_state:
+        st.session_state[constants.OPTIMAL_ONLY] = False
+
+    if constants.THREADS not in st.session_state:
+        st.session_state[constants.THREADS] = 1
+
+    if constants.PARALLEL_MODE not in st.session_state:
+        st.session_state[constants.PARALLEL_MODE] = solver.PARALLEL_MODES[0]
+
+    if constants.INCREMENTAL not in st.session_state:
+        st.session_state[constants.INCREMENTAL] = False
+
+    if constants.PRINT_WITH_FUNCTIONS not in st.session_state:
+        st.session_state[constants.PRINT_WITH_FUNCTIONS] = False
+
+    if constants.COMPILED not in st.session_state:
+        st.session_state[constants.COMPILED] = None
+
+    if constants.SOLVED not in st.session_state:
+        st.session_state[constants.SOLVED] = None
+
+    # the links generated before the current format have the state in the cnl parameter
+    shared_state = links.shared_state(st.query_params, ["cnl"])
+    for element in [constants.CNL_STATEMENTS, constants.RUN_SOLVER, constants.OPTIMIZE, constants.SELECTED_SYMBOLS]:
+        if element in shared_state:
+            st.session_state[element] = shared_state[element]
+    if shared_state:
+        st.query_params.clear()
 
 
 def reset():
@@ -62,42 +95,54 @@ def reset():
     st.session_state[constants.ERROR] = None
 
 
-def get_asp_encoding():
-    try:
-        sys.stdout = exception = StringIO()
-        tool = Cnl2asp(st.session_state[constants.CNL_STATEMENTS])
-        asp_encoding = tool.compile()
-        sys.stdout = sys.__stdout__
-        sys.stderr = sys.__stderr__
-        if str(exception.getvalue()) != "":
-            return False, str(exception.getvalue())
-        else:
-            st.session_state[constants.SYMBOLS] = []
-            st.session_state['str_to_symbols'] = {}
-            for symbol in tool.get_symbols():
-                symbol_string = f"{symbol.predicate}/{len(symbol.attributes)}"
-                st.session_state[constants.SYMBOLS].append(symbol_string)
-                st.session_state[constants.STR_2_SYMBOL][symbol_string] = symbol
-            if st.session_state[constants.OPTIMIZE]:
-                selected_symbols = [st.session_state[constants.STR_2_SYMBOL][x]
-                                    for x in st.session_state[constants.SELECTED_SYMBOLS]]
-                asp_encoding = tool.optimize(asp_encoding, selected_symbols)
-            return True, asp_encoding
-    except Exception as e:
-        return False, str(e)
+def compilation_key():
+    optimize_settings = sorted(st.session_state[constants.SELECTED_SYMBOLS]) \
+        if st.session_state[constants.OPTIMIZE] else None
+    return cache.digest('cnl2asp', st.session_state[constants.CNL_STATEMENTS],
+                        st.session_state[constants.PRINT_WITH_FUNCTIONS],
+                        st.session_state[constants.OPTIMIZE], optimize_settings)
+
 
+def solver_key():
+    return cache.digest(st.session_state[constants.ASP_ENCODING], st.session_state[constants.SELECTED_SYMBOLS],
+                        st.session_state[constants.TIME_LIMIT], st.session_state[constants.MODELS],
+                        st.session_state[constants.OPTIMAL_ONLY], st.session_state[constants.THREADS],
+                        st.session_state[constants.PARALLEL_MODE],
+                        st.session_state[constants.INSTANCE].key if st.session_state[constants.INSTANCE] else None)
 
+
+def get_asp_encoding():
+    result = conversion.cnl_to_asp(st.session_state[constants.CNL_STATEMENTS],
+                                   st.session_state[constants.PRINT_WITH_FUNCTIONS],
+                                   st.session_state[constants.OPTIMIZE], st.session_state[constants.SELECTED_SYMBOLS],
+                                   st.session_state[constants.INCREMENTAL], profiler)
+    if not result.ok:
+        return False, result.diagnostics
+    st.session_state[constants.SYMBOLS] = list(result.symbols)
+    st.session_state[constants.STR_2_SYMBOL] = dict(result.symbols)
+    return True, result.output
+
+
+@metrics.timed('cnl2asp', 'convert_text')
 def convert_text():
     if not st.session_state[constants.CNL_STATEMENTS] or st.session_state[constants.CNL_STATEMENTS].strip() == "":
         return
-    reset()
-    result, message = get_asp_encoding()
-    if result:
-        st.session_state[constants.ASP_ENCODING] = message
-        if st.session_state[constants.RUN_SOLVER]:
-            run_clingo()
-    else:
-        st.session_state[constants.ERROR] = message
+    key = compilation_key()
+    if key != st.session_state[constants.COMPILED]:
+        reset()
+        result, message = get_asp_encoding()
+        st.session_state[constants.COMPILED] = key
+        if result:
+            st.session_state[constants.ASP_ENCODING] = message
+        else:
+            st.session_state[constants.ERROR] = message
+            metrics.errors.inc('cnl2asp', 'convert_text')
+    if st.session_state[constants.RUN_SOLVER] and st.session_state[constants.ASP_ENCODING] is not None:
+        key = solver_key()
+        if key != st.session_state[constants.SOLVED] or st.session_state[constants.SOLVE_JOB] is None:
+            with profiler.phase('solve'):
+                run_clingo()
+            st.session_state[constants.SOLVED] = key
 
 
 def update_optimize():
@@ -105,23 +150,102 @@ def update_optimize():
     optimize.toggle = False
 
 
+def update_incremental():
+    st.session_state[constants.INCREMENTAL] = not st.session_state[constants.INCREMENTAL]
+
+
 def update_run_solver():
     st.session_state[constants.RUN_SOLVER] = not st.session_state[constants.RUN_SOLVER]
     run_solver.toggle = False
 
 
-def on_model(m):
-    st.session_state.answer_set = str(m)
+def update_time_limit():
+    st.session_state[constants.TIME_LIMIT] = st.session_state.time_limit
+
 
+def update_solver_options():
+    st.session_state[constants.MODELS] = st.session_state.models
+    st.session_state[constants.OPTIMAL_ONLY] = st.session_state.optimal_only
+    st.session_state[constants.THREADS] = st.session_state.threads
+    st.session_state[constants.PARALLEL_MODE] = st.session_state.parallel_mode
 
+
+@metrics.timed('cnl2asp', 'run_clingo')
 def run_clingo():
     if st.session_state[constants.ASP_ENCODING] is None:
         return
-    ctl = clingo.Control()
-    to_show = '\n'.join([f"#show {x}." for x in st.session_state[constants.SELECTED_SYMBOLS]])
-    ctl.add("base", [], f"{st.session_state[constants.ASP_ENCODING]}\n{to_show}")
-    ctl.ground([("base", [])])
-    ctl.solve(on_model=on_model)
+    if st.session_state[constants.SOLVE_JOB] is not None:
+        st.session_state[constants.SOLVE_JOB].cancel()
+    sections = None
+    if constants.GROUNDING_LIMIT is not None:
+        sections = conversion.grounding_sections(st.session_state[constants.CNL_STATEMENTS],
+                                                 st.session_state[constants.ASP_ENCODING],
+                                                 st.session_state[constants.PRINT_WITH_FUNCTIONS],
+                                                 st.session_state[constants.OPTIMIZE])
+    st.session_state[constants.SOLVE_JOB] = solver.SolveJob(st.session_state[constants.ASP_ENCODING],
+                                                            st.session_state[constants.TIME_LIMIT],
+                                                            st.session_state[constants.MODELS],
+                                                            st.session_state[constants.OPTIMAL_ONLY],
+                                                            st.session_state[constants.THREADS],
+                                                            st.session_state[constants.PARALLEL_MODE],
+                                                            sections,
+                                                            st.session_state[constants.SELECTED_SYMBOLS],
+                                                            st.session_state[constants.INSTANCE])
+    st.session_state.pop('answer_page', None)
+    st.session_state.pop('answer_download', None)
+
+
+def format_models(models, start=0):
+    answer_sets = []
+    for i, model in enumerate(models, start + 1):
+        answer_set = f"Answer: {i}\n{model.symbols}"
+        if model.cost:
+            answer_set += f"\nOptimization: {' '.join(str(x) for x in model.cost)}"
+        answer_sets.append(answer_set)
+    return '\n'.join(answer_sets)
+
+
+def show_grounding(report):
+    if report is None or (report['complete'] and report['rules'] <= constants.GROUNDING_WARNING):
+        return
+    if report['complete']:
+        st.warning(f"The grounding has {report['rules']} rules and {report['atoms']} atoms, solving might take long.")
+    st.markdown("Statements with the largest grounding:\n" +
+                '\n'.join(f"- {costly['rules']} rules, {costly['atoms']} atoms: `{costly['statement']}`"
+                           for costly in report['statements']))
+
+
+def show_answer_sets(polling):
+    job = st.session_state[constants.SOLVE_JOB]
+    if job is None:
+        return
+    if job.running:
+        status, cancel = st.columns([3, 1])
+        status.info(f"Solving... {len(job.models)} answer set(s) found so far.")
+        cancel.button(label="Cancel", on_click=job.cancel, help="Stop clingo")
+    elif job.status == solver.ERROR:
+        st.error('\n'.join(job.messages))
+    elif job.status == solver.GROUNDING_LIMIT:
+        st.error(f"The grounding exceeds {constants.GROUNDING_LIMIT} rules, the program was not solved.")
+    else:
+        st.caption(f"{job.status}: {len(job.models)} answer set(s)")
+    show_grounding(job.grounding)
+    # only the answer sets of the current page are rendered, the others stay in the job
+    pages = max(1, math.ceil(len(job.models) / constants.MODELS_PER_PAGE))
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, key='answer_page')
+    start = (page - 1) * constants.MODELS_PER_PAGE
+    st.text_area("Answer set", value=format_models(job.models[start:start + constants.MODELS_PER_PAGE], start))
+    if not job.running:
+        # the answer sets are formatted once for the download, not at each rerun of the page
+        download = st.session_state.get('answer_download')
+        if download is None or download[0] is not job:
+            download = job, format_models(job.models)
+            st.session_state['answer_download'] = download
+        st.download_button("Download", download[1], file_name="answer_set.txt", help="Download answer set")
+    if polling and not job.running:
+        st.rerun()
 
 
 def call_asp_chef():
@@ -165,15 +289,12 @@ def call_asp_chef():
 def generate_shareable_link():
     if st.session_state[constants.CNL_STATEMENTS].strip() == "":
         return
-    compressed = dumbo.compress_object_for_url(
-        {
-            constants.CNL_STATEMENTS: f"{st.session_state[constants.CNL_STATEMENTS]}",
-            constants.RUN_SOLVER: st.session_state[constants.RUN_SOLVER],
-            constants.OPTIMIZE: st.session_state[constants.OPTIMIZE],
-            constants.SELECTED_SYMBOLS: st.session_state[constants.SELECTED_SYMBOLS]
-        }
-    )
-    st.session_state[constants.LINK] = f"https://cnl2asp.streamlit.app?cnl={compressed}"
+    st.session_state[constants.LINK] = links.share("", {
+        constants.CNL_STATEMENTS: f"{st.session_state[constants.CNL_STATEMENTS]}",
+        constants.RUN_SOLVER: st.session_state[constants.RUN_SOLVER],
+        constants.OPTIMIZE: st.session_state[constants.OPTIMIZE],
+        constants.SELECTED_SYMBOLS: st.session_state[constants.SELECTED_SYMBOLS]
+    })
 
 
 def updated_text_area():
@@ -181,9 +302,23 @@ def updated_text_area():
 
 
 def update_print_with_functions():
-    Utility.PRINT_WITH_FUNCTIONS = st.session_state.print_fn
+    st.session_state[constants.PRINT_WITH_FUNCTIONS] = st.session_state.print_fn
 
 
+def update_selected_symbols():
+    st.session_state[constants.SELECTED_SYMBOLS] = st.session_state.filter
+
+
+def update_instance():
+    st.session_state[constants.INSTANCE] = None
+    if st.session_state.instance_file is not None:
+        try:
+            st.session_state[constants.INSTANCE] = instances.read_instance(st.session_state.instance_file)
+        except uploads.UploadError as e:
+            st.session_state.instance_error = str(e)
+
+
+profiler = instrumentation.Profiler()
 init()
 st.set_page_config(page_title="CNL2ASP",
                    layout="wide")
@@ -192,45 +327,93 @@ st.title("CNL2ASP")
 st.divider()
 cnl_column, asp_column = st.columns(2, gap="medium")
 cnl_column.header("CNL")
-cnl_statements = cnl_column.text_area("Insert here your CNL statements", key="cnl", on_change=updated_text_area,
-                                      height=height, max_chars=None, value=st.session_state[constants.CNL_STATEMENTS])
+if len(st.session_state[constants.CNL_STATEMENTS] or '') > constants.EDITOR_SIZE_LIMIT:
+    views.windowed_code(cnl_column, st.session_state[constants.CNL_STATEMENTS], 'cnl_window')
+    cnl_column.caption("The statements are too large to be edited here, import the edited file instead.")
+else:
+    cnl_column.text_area("Insert here your CNL statements", key="cnl", on_change=updated_text_area, height=height,
+                         max_chars=None, value=st.session_state[constants.CNL_STATEMENTS])
 run_solver, optimize, convert = cnl_column.columns(3)
 run_solver.toggle(label="Run", value=st.session_state[constants.RUN_SOLVER],
                   help="Run clingo the produced encoding.",
                   on_change=update_run_solver)
 optimize.toggle(label="Optimize", value=st.session_state[constants.OPTIMIZE],
                 help="Optimize encoding using [ngo](https://github.com/potassco/ngo).", on_change=update_optimize)
-run_solver.toggle(label="Print with functions", key='print_fn',
+run_solver.toggle(label="Print with functions", key='print_fn', value=st.session_state[constants.PRINT_WITH_FUNCTIONS],
                   help="Print the fields as functions, when the field is itself defined as a concept.",
                   on_change=update_print_with_functions)
-convert_button = convert.button(label="Convert", on_click=convert_text(), help="Convert CNL statements to ASP")
+optimize.toggle(label="Incremental", value=st.session_state[constants.INCREMENTAL],
+                help="Only recompile the statements changed since the last conversion.",
+                on_change=update_incremental)
+convert_button = convert.button(label="Convert", help="Convert CNL statements to ASP")
+convert.number_input("Time limit (s)", min_value=1, value=st.session_state[constants.TIME_LIMIT], key='time_limit',
+                     help="Stop clingo after the given number of seconds.", on_change=update_time_limit)
+with cnl_column.expander("Solver options"):
+    models, threads = st.columns(2)
+    models.number_input("Number of models", min_value=0, value=st.session_state[constants.MODELS], key='models',
+                        help="Number of answer sets to compute, 0 for all of them.", on_change=update_solver_options)
+    models.toggle(label="Optimal only", value=st.session_state[constants.OPTIMAL_ONLY], key='optimal_only',
+                  help="Only show the optimal answer sets.", on_change=update_solver_options)
+    threads.number_input("Threads", min_value=1, max_value=8, value=st.session_state[constants.THREADS],
+                         key='threads', help="Number of solver threads.", on_change=update_solver_options)
+    threads.selectbox("Parallel mode", solver.PARALLEL_MODES, key='parallel_mode',
+                      index=solver.PARALLEL_MODES.index(st.session_state[constants.PARALLEL_MODE]),
+                      help="Let the threads compete on the whole search space, or split it among them.",
+                      on_change=update_solver_options)
+with cnl_column.expander("Instance"):
+    st.file_uploader("Facts solved with the encoding", type=['lp', 'asp', 'csv'], key='instance_file',
+                     on_change=update_instance,
+                     help="A file of facts, or a CSV file whose rows after the header are facts of the predicate "
+                          "named after the file.")
+    if 'instance_error' in st.session_state:
+        st.error(st.session_state.pop('instance_error'))
+    elif st.session_state[constants.INSTANCE] is not None:
+        st.caption(f"{st.session_state[constants.INSTANCE].statements} statement(s) "
+                   f"from {st.session_state[constants.INSTANCE].name}")
+convert_text()
 generate_link, link_area = cnl_column.columns([1, 4])
 generate_link.button(label="Generate link", on_click=generate_shareable_link, help="Generate a shareable link to this page")
 link_area.code(st.session_state[constants.LINK], line_numbers=False)
-selected = cnl_column.multiselect("Filter output", options=st.session_state[constants.SYMBOLS],
-                                  default=st.session_state[constants.SELECTED_SYMBOLS])
-st.session_state[constants.SELECTED_SYMBOLS] = selected
+cnl_column.multiselect("Filter output", options=st.session_state[constants.SYMBOLS], key='filter',
+                       default=[x for x in st.session_state[constants.SELECTED_SYMBOLS]
+                                if x in st.session_state[constants.SYMBOLS]],
+                       on_change=update_selected_symbols)
 
 with st.form("my-form", clear_on_submit=True):
     uploaded_file = st.file_uploader("Choose a CNL file")
     submitted = st.form_submit_button("Import")
     if submitted and uploaded_file is not None:
-        stringio = StringIO(uploaded_file.getvalue().decode("utf-8"))
-        string_data = stringio.read()
-        st.session_state[constants.CNL_STATEMENTS] = string_data
-        st.rerun()
+        try:
+            st.session_state[constants.CNL_STATEMENTS] = uploads.read_upload(uploaded_file)
+        except uploads.UploadError as e:
+            st.error(str(e))
+        else:
+            st.rerun()
 
 asp_column.header("ASP")
 asp_column.markdown("***")
 if st.session_state[constants.ASP_ENCODING] is not None:
-    asp_column.code(st.session_state[constants.ASP_ENCODING], language="prolog", line_numbers=True)
+    views.windowed_code(asp_column, st.session_state[constants.ASP_ENCODING], 'asp_window', language="prolog",
+                        line_numbers=True)
     download, asp_chef = asp_column.columns(2)
     download.download_button("Download", str(st.session_state[constants.ASP_ENCODING]),
                              file_name='encoding.asp', help="Download ASP encoding")
     asp_chef.link_button(label="Open in ASP Chef", url=call_asp_chef(), help="Open encoding in ASP Chef tool")
-    if st.session_state[constants.RUN_SOLVER]:
-        asp_column.text_area("Answer set", key="answer_set")
-        asp_column.download_button("Download", st.session_state.answer_set,
-                                   file_name="answer_set.txt", help="Download answer set")
+    if st.session_state[constants.RUN_SOLVER] and st.session_state[constants.SOLVE_JOB] is not None:
+        solving = st.session_state[constants.SOLVE_JOB].running
+        with asp_column:
+            st.experimental_fragment(show_answer_sets, run_every=0.5 if solving else None)(solving)
 elif st.session_state[constants.ERROR] is not None:
-    asp_column.error(st.session_state[constants.ERROR])
+    for diagnostic in st.session_state[constants.ERROR]:
+        if diagnostic.severity == diagnostics.WARNING:
+            asp_column.warning(diagnostic.message)
+        else:
+            asp_column.error(diagnostic.message)
+with cnl_column.expander("Instrumentation"):
+    report = profiler.report()
+    if st.session_state[constants.SOLVE_JOB] is not None:
+        report['solver'] = st.session_state[constants.SOLVE_JOB].statistics
+    st.json(report)
+    st.download_button("Export", json.dumps(report), file_name="instrumentation.json", mime="application/json",
+                       help="Export the instrumentation data as JSON")
+metrics.observe_session()
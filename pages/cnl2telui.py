@@ -1,18 +1,16 @@
-import base64
-import zlib
-from io import StringIO
-
-import clingo
-from cnl2asp.ASP_elements.solver.telingo_result_parser import TelingoResultParser
-from cnl2asp.ASP_elements.solver.telingo_wrapper import Telingo
-from cnl2asp.cnl2asp import Cnl2asp
-import sys
 import streamlit as st
 import json
-import dumbo_utils.url as dumbo
-from cnl2asp.utility.utility import Utility
 
+import cache
 import constants
+import conversion
+import diagnostics
+import instrumentation
+import links
+import metrics
+import solver
+import uploads
+import views
 
 height = 400
 
@@ -48,17 +46,37 @@ def init():
     if constants.PARSE_RESULT not in st.session_state:
         st.session_state[constants.PARSE_RESULT] = False
 
-    if "cnl" in st.query_params:
-        try:
-            decompressed = zlib.decompress(base64.b64decode(st.query_params["cnl"].removesuffix("!").replace(" ", "+")))
-            json_obj = json.loads(base64.b64decode(decompressed).decode())
-            for element in [constants.CNL_STATEMENTS, constants.RUN_SOLVER, constants.OPTIMIZE,
-                            constants.SELECTED_SYMBOLS]:
-                if element in json_obj:
-                    st.session_state[element] = json_obj[element]
-            st.query_params.clear()
-        except Exception as e:
-            pass
+    if constants.PRINT_WITH_FUNCTIONS not in st.session_state:
+        st.session_state[constants.PRINT_WITH_FUNCTIONS] = False
+
+    if constants.COMPILED not in st.session_state:
+        st.session_state[constants.COMPILED] = None
+
+    if constants.SOLVED not in st.session_state:
+        st.session_state[constants.SOLVED] = None
+
+    if constants.SPECIFICATION not in st.session_state:
+        st.session_state[constants.SPECIFICATION] = None
+
+    if constants.TIME_LIMIT not in st.session_state:
+        st.session_state[constants.TIME_LIMIT] = 10
+
+    if constants.SOLVE_JOB not in st.session_state:
+        st.session_state[constants.SOLVE_JOB] = None
+
+    if constants.HORIZON not in st.session_state:
+        st.session_state[constants.HORIZON] = 50
+
+    if constants.STOP_AT_FIRST_MODEL not in st.session_state:
+        st.session_state[constants.STOP_AT_FIRST_MODEL] = True
+
+    # the links generated before the current format have the state in the cnl parameter
+    shared_state = links.shared_state(st.query_params, ["cnl"])
+    for element in [constants.CNL_STATEMENTS, constants.RUN_SOLVER, constants.OPTIMIZE, constants.SELECTED_SYMBOLS]:
+        if element in shared_state:
+            st.session_state[element] = shared_state[element]
+    if shared_state:
+        st.query_params.clear()
 
 
 def reset():
@@ -66,43 +84,53 @@ def reset():
     st.session_state[constants.ERROR] = None
 
 
-def get_asp_encoding():
-    try:
-        sys.stdout = exception = StringIO()
-        tool = Cnl2asp(st.session_state[constants.CNL_STATEMENTS])
-        asp_encoding = tool.compile()
-        sys.stdout = sys.__stdout__
-        sys.stderr = sys.__stderr__
-        if str(exception.getvalue()) != "":
-            return False, str(exception.getvalue())
-        else:
-            st.session_state[constants.SYMBOLS] = []
-            st.session_state['str_to_symbols'] = {}
-            for symbol in tool.get_symbols():
-                if symbol.predicate:
-                    symbol_string = f"{symbol.predicate}/{len(symbol.attributes)}"
-                    st.session_state[constants.SYMBOLS].append(symbol_string)
-                    st.session_state[constants.STR_2_SYMBOL][symbol_string] = symbol
-            if st.session_state[constants.OPTIMIZE]:
-                selected_symbols = [st.session_state[constants.STR_2_SYMBOL][x]
-                                    for x in st.session_state[constants.SELECTED_SYMBOLS]]
-                asp_encoding = tool.optimize(asp_encoding, selected_symbols)
-            return True, asp_encoding
-    except Exception as e:
-        return False, str(e)
+def compilation_key():
+    optimize_settings = sorted(st.session_state[constants.SELECTED_SYMBOLS]) \
+        if st.session_state[constants.OPTIMIZE] else None
+    return cache.digest('cnl2tel', st.session_state[constants.CNL_STATEMENTS],
+                        st.session_state[constants.PRINT_WITH_FUNCTIONS],
+                        st.session_state[constants.OPTIMIZE], optimize_settings)
+
+
+def solver_key():
+    return cache.digest(st.session_state[constants.ASP_ENCODING], st.session_state[constants.SELECTED_SYMBOLS],
+                        st.session_state[constants.TIME_LIMIT], st.session_state[constants.HORIZON],
+                        st.session_state[constants.STOP_AT_FIRST_MODEL])
 
 
+def get_asp_encoding():
+    result = conversion.cnl_to_telingo(st.session_state[constants.CNL_STATEMENTS],
+                                       st.session_state[constants.PRINT_WITH_FUNCTIONS],
+                                       st.session_state[constants.OPTIMIZE],
+                                       st.session_state[constants.SELECTED_SYMBOLS], profiler)
+    if not result.ok:
+        return False, result.diagnostics
+    st.session_state[constants.SYMBOLS] = list(result.symbols)
+    st.session_state[constants.STR_2_SYMBOL] = dict(result.symbols)
+    st.session_state[constants.SPECIFICATION] = result.specification
+    return True, result.output
+
+
+@metrics.timed('cnl2tel', 'convert_text')
 def convert_text():
     if not st.session_state[constants.CNL_STATEMENTS] or st.session_state[constants.CNL_STATEMENTS].strip() == "":
         return
-    reset()
-    result, message = get_asp_encoding()
-    if result:
-        st.session_state[constants.ASP_ENCODING] = message
-        if st.session_state[constants.RUN_SOLVER]:
-            run_telingo()
-    else:
-        st.session_state[constants.ERROR] = message
+    key = compilation_key()
+    if key != st.session_state[constants.COMPILED]:
+        reset()
+        result, message = get_asp_encoding()
+        st.session_state[constants.COMPILED] = key
+        if result:
+            st.session_state[constants.ASP_ENCODING] = message
+        else:
+            st.session_state[constants.ERROR] = message
+            metrics.errors.inc('cnl2tel', 'convert_text')
+    if st.session_state[constants.RUN_SOLVER] and st.session_state[constants.ASP_ENCODING] is not None:
+        key = solver_key()
+        if key != st.session_state[constants.SOLVED] or st.session_state[constants.SOLVE_JOB] is None:
+            with profiler.phase('solve'):
+                run_telingo()
+            st.session_state[constants.SOLVED] = key
 
 
 def update_run_solver():
@@ -110,31 +138,81 @@ def update_run_solver():
     run_solver.toggle = False
 
 
+def update_time_limit():
+    st.session_state[constants.TIME_LIMIT] = st.session_state.time_limit
+
+
+def update_solver_options():
+    st.session_state[constants.HORIZON] = st.session_state.horizon
+    st.session_state[constants.STOP_AT_FIRST_MODEL] = st.session_state.stop_at_first_model
+
+
+@metrics.timed('cnl2tel', 'run_telingo')
 def run_telingo():
     if st.session_state[constants.ASP_ENCODING] is None:
         return
-    ctl = Telingo()
+    if st.session_state[constants.SOLVE_JOB] is not None:
+        st.session_state[constants.SOLVE_JOB].cancel()
     to_show = '\n'.join([f"#show {x}." for x in st.session_state[constants.SELECTED_SYMBOLS]])
-    ctl.load(st.session_state[constants.ASP_ENCODING] + to_show)
-    solve = ctl.solve(120)
-    st.session_state.answer_set = solve
-    if st.session_state[constants.PARSE_RESULT]:
-        st.session_state.answer_set = TelingoResultParser(Cnl2asp(st.session_state[constants.CNL_STATEMENTS]).parse_input()).parse_model(solve)
+    st.session_state[constants.SOLVE_JOB] = solver.TelingoJob(st.session_state[constants.ASP_ENCODING] + to_show,
+                                                              st.session_state[constants.TIME_LIMIT],
+                                                              st.session_state[constants.HORIZON],
+                                                              st.session_state[constants.STOP_AT_FIRST_MODEL])
+    st.session_state.pop('answer_set', None)
 
 
+def parse_result(placeholder, model):
+    parsed = ''
+    try:
+        with profiler.phase('parse'):
+            for state in conversion.parse_telingo_states(st.session_state[constants.SPECIFICATION], model):
+                parsed += state
+                placeholder.text(parsed)
+        st.session_state.answer_set = parsed
+    except Exception as e:
+        st.session_state.answer_set = str(e)
+    placeholder.empty()
+
+
+def show_answer_set(polling):
+    job = st.session_state[constants.SOLVE_JOB]
+    if job is None:
+        return
+    steps = len(job.steps)
+    if job.running:
+        status, cancel = st.columns([3, 1])
+        status.info(f"Solving... horizon {steps} reached" +
+                    (f", {job.steps[-1]:.3f}s for the last step." if steps else "."))
+        cancel.button(label="Cancel", on_click=job.cancel, help="Stop telingo")
+    elif job.status == solver.ERROR:
+        st.error('\n'.join(job.messages))
+    else:
+        st.caption(f"{job.status} at horizon {steps} in {sum(job.steps):.3f}s")
+    if job.running:
+        st.text_area("Answer set", value=job.output, height=300)
+    else:
+        if 'answer_set' not in st.session_state:
+            # the states are shown as they are parsed
+            if st.session_state[constants.PARSE_RESULT] and job.output:
+                parse_result(st.empty(), job.output)
+            else:
+                st.session_state.answer_set = job.output
+        st.text_area("Answer set", key="answer_set", height=300)
+        st.download_button("Download", st.session_state.answer_set, file_name="answer_set.txt",
+                           help="Download answer set")
+    if polling and not job.running:
+        st.rerun()
+
 
 def generate_shareable_link():
     if st.session_state[constants.CNL_STATEMENTS].strip() == "":
         return
-    compressed = dumbo.compress_object_for_url(
-        {
-            constants.CNL_STATEMENTS: f"{st.session_state[constants.CNL_STATEMENTS]}",
-            constants.RUN_SOLVER: st.session_state[constants.RUN_SOLVER],
-            constants.OPTIMIZE: st.session_state[constants.OPTIMIZE],
-            constants.SELECTED_SYMBOLS: st.session_state[constants.SELECTED_SYMBOLS]
-        }
-    )
-    st.session_state[constants.LINK] = f"https://cnl2asp.streamlit.app/cnl2telui?cnl={compressed}"
+    st.session_state[constants.LINK] = links.share("/cnl2telui", {
+        constants.CNL_STATEMENTS: f"{st.session_state[constants.CNL_STATEMENTS]}",
+        constants.RUN_SOLVER: st.session_state[constants.RUN_SOLVER],
+        constants.OPTIMIZE: st.session_state[constants.OPTIMIZE],
+        constants.SELECTED_SYMBOLS: st.session_state[constants.SELECTED_SYMBOLS]
+    })
 
 
 def updated_text_area():
@@ -142,11 +220,18 @@ def updated_text_area():
 
 
 def update_print_with_functions():
-    Utility.PRINT_WITH_FUNCTIONS = st.session_state.print_fn
+    st.session_state[constants.PRINT_WITH_FUNCTIONS] = st.session_state.print_fn
 
 def update_parse_result():
     st.session_state[constants.PARSE_RESULT] = not st.session_state[constants.PARSE_RESULT]
+    st.session_state.pop('answer_set', None)
+
+
+def update_selected_symbols():
+    st.session_state[constants.SELECTED_SYMBOLS] = st.session_state.filter
+
 
+profiler = instrumentation.Profiler()
 init()
 st.set_page_config(page_title="CNL2TEL",
                    layout="wide")
@@ -155,22 +240,36 @@ st.title("CNL2TEL")
 st.divider()
 cnl_column, asp_column = st.columns(2, gap="medium")
 cnl_column.header("CNL")
-cnl_statements = cnl_column.text_area("Insert here your CNL statements", key="cnl", on_change=updated_text_area,
-                                      height=height, max_chars=None, value=st.session_state[constants.CNL_STATEMENTS])
+if len(st.session_state[constants.CNL_STATEMENTS] or '') > constants.EDITOR_SIZE_LIMIT:
+    views.windowed_code(cnl_column, st.session_state[constants.CNL_STATEMENTS], 'cnl_window')
+    cnl_column.caption("The statements are too large to be edited here, import the edited file instead.")
+else:
+    cnl_column.text_area("Insert here your CNL statements", key="cnl", on_change=updated_text_area, height=height,
+                         max_chars=None, value=st.session_state[constants.CNL_STATEMENTS])
 run_solver, optimize, convert = cnl_column.columns(3)
 run_solver.toggle(label="Run", value=st.session_state[constants.RUN_SOLVER],
                   help="Run telingo with the produced encoding.",
                   on_change=update_run_solver)
-run_solver.toggle(label="Print with functions", key='print_fn',
+run_solver.toggle(label="Print with functions", key='print_fn', value=st.session_state[constants.PRINT_WITH_FUNCTIONS],
                   help="Print the fields as functions, when the field is itself defined as a concept.",
                   on_change=update_print_with_functions)
 run_solver.toggle(label="Parse result", value=st.session_state[constants.PARSE_RESULT],
                   help="Parse the telingo result.",
                   on_change=update_parse_result)
-convert_button = convert.button(label="Convert", on_click=convert_text(), help="Convert CNL statements to TELINGO")
-selected = cnl_column.multiselect("Filter output", options=st.session_state[constants.SYMBOLS],
-                                  default=st.session_state[constants.SELECTED_SYMBOLS])
-st.session_state[constants.SELECTED_SYMBOLS] = selected
+convert_button = convert.button(label="Convert", help="Convert CNL statements to TELINGO")
+convert.number_input("Time limit (s)", min_value=1, value=st.session_state[constants.TIME_LIMIT], key='time_limit',
+                     help="Stop telingo after the given number of seconds.", on_change=update_time_limit)
+with cnl_column.expander("Solver options"):
+    st.number_input("Horizon", min_value=1, value=st.session_state[constants.HORIZON], key='horizon',
+                    help="Maximum number of states of the traces.", on_change=update_solver_options)
+    st.toggle(label="Stop at first model", value=st.session_state[constants.STOP_AT_FIRST_MODEL],
+              key='stop_at_first_model', on_change=update_solver_options,
+              help="Increase the horizon until a model is found, instead of only solving at the maximum horizon.")
+convert_text()
+cnl_column.multiselect("Filter output", options=st.session_state[constants.SYMBOLS], key='filter',
+                       default=[x for x in st.session_state[constants.SELECTED_SYMBOLS]
+                                if x in st.session_state[constants.SYMBOLS]],
+                       on_change=update_selected_symbols)
 generate_link, link_area = cnl_column.columns([1, 4])
 generate_link.button(label="Generate link", on_click=generate_shareable_link, help="Generate a shareable link to this page")
 link_area.code(st.session_state[constants.LINK], line_numbers=False)
@@ -179,21 +278,36 @@ with st.form("my-form", clear_on_submit=True):
     uploaded_file = st.file_uploader("Choose a CNL file")
     submitted = st.form_submit_button("Import")
     if submitted and uploaded_file is not None:
-        stringio = StringIO(uploaded_file.getvalue().decode("utf-8"))
-        string_data = stringio.read()
-        st.session_state[constants.CNL_STATEMENTS] = string_data
-        st.rerun()
+        try:
+            st.session_state[constants.CNL_STATEMENTS] = uploads.read_upload(uploaded_file)
+        except uploads.UploadError as e:
+            st.error(str(e))
+        else:
+            st.rerun()
 
 asp_column.header("TELINGO")
 asp_column.markdown("***")
 if st.session_state[constants.ASP_ENCODING] is not None:
-    asp_column.code(st.session_state[constants.ASP_ENCODING], language="prolog", line_numbers=True)
+    views.windowed_code(asp_column, st.session_state[constants.ASP_ENCODING], 'asp_window', language="prolog",
+                        line_numbers=True)
     download, asp_chef = asp_column.columns(2)
     download.download_button("Download", str(st.session_state[constants.ASP_ENCODING]),
                              file_name='encoding.asp', help="Download ASP encoding")
-    if st.session_state[constants.RUN_SOLVER]:
-        asp_column.text_area("Answer set", key="answer_set", height=300)
-        asp_column.download_button("Download", st.session_state.answer_set,
-                                   file_name="answer_set.txt", help="Download answer set")
+    if st.session_state[constants.RUN_SOLVER] and st.session_state[constants.SOLVE_JOB] is not None:
+        solving = st.session_state[constants.SOLVE_JOB].running
+        with asp_column:
+            st.experimental_fragment(show_answer_set, run_every=0.5 if solving else None)(solving)
 elif st.session_state[constants.ERROR] is not None:
-    asp_column.error(st.session_state[constants.ERROR])
+    for diagnostic in st.session_state[constants.ERROR]:
+        if diagnostic.severity == diagnostics.WARNING:
+            asp_column.warning(diagnostic.message)
+        else:
+            asp_column.error(diagnostic.message)
+with cnl_column.expander("Instrumentation"):
+    report = profiler.report()
+    if st.session_state[constants.SOLVE_JOB] is not None:
+        report['solver'] = st.session_state[constants.SOLVE_JOB].statistics
+    st.json(report)
+    st.download_button("Export", json.dumps(report), file_name="instrumentation.json", mime="application/json",
+                       help="Export the instrumentation data as JSON")
+metrics.observe_session()
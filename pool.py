@@ -0,0 +1,313 @@
+import collections
+import importlib
+import os
+import resource
+import signal
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Connection, Pipe
+
+import constants
+
+CANCEL = "cancel"
+DONE = "done"
+FAILED = "failed"
+
+POLLING_INTERVAL = 0.1
+CANCEL_GRACE_PERIOD = 2
+
+
+class PoolBusy(Exception):
+    pass
+
+
+class Job:
+    """
+    A function executed by a worker of the pool.
+
+    The function is called as function(payload, channel) in the worker process, and the messages it sends
+    on the channel are passed to on_message in the server process. The jobs with the same affinity are run by the
+    worker that ran the previous one, unless it is busy, so that they can reuse what it kept in memory.
+    """
+
+    def __init__(self, function, payload, timeout: float, affinity: str = None):
+        self.function = function
+        self.payload = payload
+        self.timeout = timeout
+        self.affinity = affinity
+        self.error = None
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def wait(self, timeout: float = None):
+        self._done.wait(timeout)
+
+    def worker_payload(self, kept: bool):
+        """Return the payload sent to the worker, kept telling whether the worker ran the last job of the affinity."""
+        return self.payload
+
+    def on_message(self, *message):
+        pass
+
+    def on_finish(self, error: str = None):
+        self.error = error
+        self._done.set()
+
+
+class Channel:
+    """The end of the pipe used by a job in the worker process."""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._cancelled = False
+
+    def send(self, *message):
+        self._connection.send(message)
+
+    def cancelled(self) -> bool:
+        while not self._cancelled and self._connection.poll():
+            self._cancelled = self._connection.recv() == CANCEL
+        return self._cancelled
+
+
+def _serve(connection, memory_limit: int, cpu_limit: int):
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    while True:
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            # the server closed the pipe
+            return
+        if message == CANCEL:
+            # the job was already completed when it was cancelled
+            continue
+        function, payload = message
+        # the cpu limit counts the time of the whole process, hence it is moved forward for each job
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        resource.setrlimit(resource.RLIMIT_CPU,
+                           (int(usage.ru_utime + usage.ru_stime) + cpu_limit, resource.RLIM_INFINITY))
+        # the failures tell whether the worker exits after them, so that the server does not send it other jobs
+        try:
+            function(payload, Channel(connection))
+            connection.send((DONE,))
+        except (MemoryError, RuntimeError) as e:
+            if isinstance(e, MemoryError) or 'bad_alloc' in str(e):
+                connection.send((FAILED, 'Memory limit exceeded.', True))
+                return
+            connection.send((FAILED, str(e), False))
+        except Exception as e:
+            connection.send((FAILED, str(e), False))
+
+
+class WorkerPool:
+    """
+    A bounded pool of worker processes, each limited in memory and cpu time, importing the modules of
+    constants.WORKER_PRELOAD when it starts.
+
+    Jobs exceeding the size of the queue are rejected, and the workers are replaced after a number of jobs
+    to release the memory retained by the solvers.
+    """
+
+    def __init__(self, workers: int, queue_size: int, jobs_per_worker: int, memory_limit: int, cpu_limit: int):
+        self.queue_size = queue_size
+        self.jobs_per_worker = jobs_per_worker
+        self.memory_limit = memory_limit
+        self.cpu_limit = cpu_limit
+        self._jobs = collections.deque()
+        self._condition = threading.Condition()
+        # the worker that ran the last job of each affinity, and the workers running a job
+        self._owners = {}
+        self._busy = [False] * workers
+        # the workers are replaced when the pool is restarted, each one recording the restart it follows
+        self._generation = 0
+        self._generations = [0] * workers
+        for index in range(workers):
+            threading.Thread(target=self._dispatch, args=(index,), daemon=True).start()
+
+    @property
+    def queued(self) -> int:
+        with self._condition:
+            return len(self._jobs)
+
+    @property
+    def busy(self) -> int:
+        with self._condition:
+            return sum(self._busy)
+
+    def submit(self, job: Job):
+        with self._condition:
+            if len(self._jobs) >= self.queue_size:
+                raise PoolBusy('The server is busy, please try again later.')
+            self._jobs.append(job)
+            self._condition.notify_all()
+
+    def restart(self):
+        """Replace the workers once they finish their current job, dropping what they kept, and wait for it."""
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+            while any(generation != self._generation for generation in self._generations):
+                self._condition.wait()
+
+    def _next(self, index: int) -> tuple[Job, bool]:
+        """
+        Wait for the first job without a worker owning its affinity, or owned by this worker, or by a busy one.
+
+        Returns the job, and whether this worker owns its affinity, or None if the worker must be replaced.
+        """
+        with self._condition:
+            while True:
+                if self._generations[index] != self._generation:
+                    return None, False
+                for job in self._jobs:
+                    owner = self._owners.get(job.affinity)
+                    if owner is None or owner == index or self._busy[owner]:
+                        self._jobs.remove(job)
+                        self._busy[index] = True
+                        return job, job.affinity is not None and owner == index
+                self._condition.wait()
+
+    def _finished(self, index: int, affinity: str = None, retired: bool = False):
+        with self._condition:
+            self._busy[index] = False
+            if retired:
+                self._owners = {key: owner for key, owner in self._owners.items() if owner != index}
+            elif affinity is not None:
+                self._owners[affinity] = index
+            self._condition.notify_all()
+
+    def _replaced(self, index: int):
+        with self._condition:
+            self._generations[index] = self._generation
+            self._owners = {key: owner for key, owner in self._owners.items() if owner != index}
+            self._condition.notify_all()
+
+    def _spawn(self):
+        # the workers are started as new interpreters, since streamlit replaces the __main__ module
+        # that multiprocessing would import again in each worker; their results are sent on the pipe,
+        # so what the solvers print is discarded
+        connection, worker_connection = Pipe()
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), str(worker_connection.fileno()),
+                                    str(self.memory_limit), str(self.cpu_limit)],
+                                   pass_fds=[worker_connection.fileno()], stdout=subprocess.DEVNULL)
+        worker_connection.close()
+        return process, connection
+
+    def _dispatch(self, index: int):
+        # the worker is started before the first job, and replaced as soon as it is retired, so that the jobs
+        # do not wait for the interpreter to start and import the solvers
+        process, connection = self._spawn()
+        jobs = 0
+        while True:
+            job, kept = self._next(index)
+            if job is None:
+                connection.close()
+                _stop(process)
+                process, connection = self._spawn()
+                jobs = 0
+                self._replaced(index)
+                continue
+            if job.cancelled:
+                job.on_finish('Cancelled.')
+                self._finished(index)
+                continue
+            if process.poll() is not None:
+                connection.close()
+                process, connection = self._spawn()
+                jobs = 0
+                kept = False
+            jobs += 1
+            reusable = self._run(job, process, connection, kept)
+            self._finished(index, job.affinity, not reusable or jobs >= self.jobs_per_worker)
+            if reusable and jobs < self.jobs_per_worker:
+                continue
+            connection.close()
+            if reusable:
+                _stop(process)
+            else:
+                process.kill()
+                process.wait()
+            process, connection = self._spawn()
+            jobs = 0
+
+    def _run(self, job: Job, process, connection, kept: bool = False) -> bool:
+        """Follow the execution of the job, returning whether the worker can be reused."""
+        deadline = time.monotonic() + job.timeout
+        cancelled_at = None
+        try:
+            connection.send((job.function, job.worker_payload(kept)))
+            while True:
+                if connection.poll(POLLING_INTERVAL):
+                    message = connection.recv()
+                    if message[0] == DONE:
+                        job.on_finish()
+                        return True
+                    if message[0] == FAILED:
+                        job.on_finish(message[1])
+                        exiting = message[2]
+                        return not exiting
+                    job.on_message(*message)
+                elif process.poll() is not None:
+                    raise EOFError()
+                now = time.monotonic()
+                if job.cancelled and cancelled_at is None:
+                    connection.send(CANCEL)
+                    cancelled_at = now
+                if cancelled_at is not None and now > cancelled_at + CANCEL_GRACE_PERIOD:
+                    job.on_finish('Cancelled.')
+                    return False
+                if now > deadline + CANCEL_GRACE_PERIOD:
+                    job.on_finish('Time limit exceeded.')
+                    return False
+        except (EOFError, OSError):
+            _stop(process)
+            if process.returncode == -signal.SIGXCPU:
+                job.on_finish('CPU time limit exceeded.')
+            else:
+                job.on_finish(f'The solver terminated unexpectedly (exit code {process.returncode}).')
+            return False
+
+
+def _stop(process: subprocess.Popen):
+    try:
+        process.wait(CANCEL_GRACE_PERIOD)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> WorkerPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(constants.SOLVER_WORKERS, constants.SOLVER_QUEUE_SIZE, constants.SOLVER_JOBS_PER_WORKER,
+                               constants.SOLVER_MEMORY_LIMIT, constants.SOLVER_CPU_LIMIT)
+        return _pool
+
+
+def started_pool() -> WorkerPool:
+    """Return the pool if it was started, None otherwise."""
+    return _pool
+
+
+if __name__ == '__main__':
+    for module in constants.WORKER_PRELOAD:
+        importlib.import_module(module)
+    _serve(Connection(int(sys.argv[1])), int(sys.argv[2]), int(sys.argv[3]))
@@ -0,0 +1,474 @@
+import collections
+import time
+from typing import NamedTuple
+
+import clingo
+from clingo import ast
+
+import cache
+import constants
+import grounding
+import metrics
+import instrumentation
+import pool
+
+RUNNING = "RUNNING"
+SATISFIABLE = "SATISFIABLE"
+OPTIMUM_FOUND = "OPTIMUM FOUND"
+UNSATISFIABLE = "UNSATISFIABLE"
+UNKNOWN = "UNKNOWN"
+TIMEOUT = "TIMEOUT"
+CANCELLED = "CANCELLED"
+ERROR = "ERROR"
+GROUNDING_LIMIT = "GROUNDING LIMIT"
+# the worker did not keep the control of a job sent without its instance, the job is sent again with it
+RESEND = "RESEND"
+
+GROUNDING = "grounding"
+MESSAGE = "message"
+MODEL = "model"
+OUTPUT = "output"
+RESULT = "result"
+STEP = "step"
+
+POLLING_INTERVAL = 0.1
+PARALLEL_MODES = ["compete", "split"]
+# the results of the solvers that do not depend on the time limit
+COMPLETED = [SATISFIABLE, OPTIMUM_FOUND, UNSATISFIABLE]
+
+
+class Model(NamedTuple):
+    symbols: str
+    cost: list[int]
+    optimal: bool
+
+
+def statistics(ctl: clingo.Control, time_ground: float = None) -> dict:
+    """
+    Extract a compact summary of the clingo statistics, with the peak memory of the worker.
+
+    If the grounding time is not measured, it is approximated by the time not spent solving.
+    """
+    stats = ctl.statistics
+    times = stats['summary']['times']
+    return {
+        'atoms': stats['problem']['lp']['atoms'],
+        'rules': stats['problem']['lp']['rules'],
+        'choices': stats['solving']['solvers']['choices'],
+        'conflicts': stats['solving']['solvers']['conflicts'],
+        'models': stats['summary']['models']['enumerated'],
+        'time_ground': times['total'] - times['solve'] if time_ground is None else time_ground,
+        'time_solve': times['solve'],
+        'time_total': times['total'],
+        'time_cpu': times['cpu'],
+        'peak_rss': instrumentation.peak_rss(),
+    }
+
+
+def _is_ground(term: ast.AST) -> bool:
+    # the terms with variables, intervals, pools or operations are not taken as ground
+    if term.ast_type == ast.ASTType.SymbolicTerm:
+        return True
+    if term.ast_type == ast.ASTType.UnaryOperation:
+        return term.operator_type == ast.UnaryOperator.Minus and _is_ground(term.argument)
+    return term.ast_type == ast.ASTType.Function and all(_is_ground(argument) for argument in term.arguments)
+
+
+def _is_fact(statement: ast.AST) -> bool:
+    return statement.ast_type == ast.ASTType.Rule and not statement.body and \
+        statement.head.ast_type == ast.ASTType.Literal and statement.head.sign == ast.Sign.NoSign and \
+        statement.head.atom.ast_type == ast.ASTType.SymbolicAtom and _is_ground(statement.head.atom.symbol)
+
+
+def split_facts(program: str) -> tuple[str, list[str]]:
+    """
+    Split a program in its rules and its facts, the ground atoms of its base part.
+
+    The program is parsed, and the facts are cut from its text, keeping the lines of the rules. It is returned
+    unchanged if it cannot be parsed, so that clingo reports the errors.
+    """
+    data = program.encode()
+    # the locations of the parser count the lines from 1, and the columns in bytes from 1
+    lines = [0]
+    position = data.find(b'\n')
+    while position != -1:
+        lines.append(position + 1)
+        position = data.find(b'\n', position + 1)
+    facts = []
+    spans = []
+    base = True
+
+    def add(statement):
+        nonlocal base
+        if statement.ast_type == ast.ASTType.Program:
+            base = statement.name == 'base' and not statement.parameters
+        elif base and _is_fact(statement):
+            begin, end = statement.location.begin, statement.location.end
+            facts.append(str(statement))
+            spans.append((lines[begin.line - 1] + begin.column - 1, lines[end.line - 1] + end.column - 1))
+
+    # the errors are logged by clingo, a Python logger makes it abort on the messages holding truncated characters
+    try:
+        ast.parse_string(program, add)
+    except RuntimeError:
+        return program, []
+    rules = []
+    start = 0
+    for begin, end in spans:
+        rules.append(data[start:begin])
+        start = end
+    rules.append(data[start:])
+    return b''.join(rules).decode(), facts
+
+
+class _Grounded:
+    """A control grounded by a worker, kept to solve its rules again with other options, filters or more facts."""
+
+    def __init__(self, rules: str, options: list[str], channel: pool.Channel):
+        # the channel is the one of the job using the control, set before creating it since clingo logs from then
+        self.channel = channel
+        self.ctl = clingo.Control(["--stats", *options], logger=self._log)
+        defined, used = grounding.predicates(rules)
+        self.predicates = defined | used
+        self.facts = set()
+        self.parts = 0
+
+    def _log(self, code, message):
+        # clingo aborts if its logger raises
+        try:
+            self.channel.send(MESSAGE, message)
+        except Exception:
+            pass
+
+    def extension(self, facts: list[str]) -> list[str]:
+        """
+        Return the facts to ground to extend the control to the given ones, None if it must be grounded again.
+
+        The rules already grounded are not instantiated again, hence the new facts cannot be used by them.
+        """
+        if not self.facts.issubset(facts):
+            return None
+        extension = [fact for fact in dict.fromkeys(facts) if fact not in self.facts]
+        for fact in extension:
+            symbol = clingo.parse_term(fact[:-1])
+            if (symbol.name, len(symbol.arguments)) in self.predicates:
+                return None
+        return extension
+
+    def ground(self, program: str, facts: list[str], instance: tuple[str, ...] = ()):
+        # each extension is grounded as a new program part
+        part = f"part_{self.parts}"
+        self.parts += 1
+        self.ctl.add(part, [], program)
+        # the batches of the instance are added to the part one at a time, so that they are never joined
+        for batch in instance:
+            self.ctl.add(part, [], batch)
+        self.ctl.ground([(part, [])])
+        self.facts.update(facts)
+
+
+# the controls kept by the worker, the least recently used first
+_controls = collections.OrderedDict()
+
+
+def _shown(model: clingo.Model, show: set) -> str:
+    """Print the atoms of a model, only the ones of the given predicates if any, as #show statements would."""
+    if not show:
+        return str(model)
+    return ' '.join(str(symbol) for symbol in model.symbols(atoms=True)
+                    if (symbol.name, len(symbol.arguments)) in show)
+
+
+def solve_clingo(payload, channel: pool.Channel):
+    key, rules, facts, instance, show, settings, options, time_limit, sections, grounding_limit = payload
+    deadline = time.monotonic() + time_limit
+    grounded = _controls.pop(key, None)
+    extension = grounded.extension(facts) if grounded is not None else None
+    if extension is None and instance is None:
+        channel.send(RESULT, RESEND, {})
+        return
+    report = {}
+    start = time.perf_counter()
+    if extension is None:
+        grounded = _Grounded(rules, options, channel)
+        if sections:
+            # the grounding is analyzed within a budget, so that the programs too large to ground are refused, in the
+            # control then solved, since the sections hold the whole program
+            report = {'grounding': grounding.analyze(sections, grounding_limit, deadline, channel.cancelled,
+                                                     instance, grounded.ctl)}
+            channel.send(GROUNDING, report['grounding'])
+            if not report['grounding']['complete']:
+                status = CANCELLED if channel.cancelled() else TIMEOUT if time.monotonic() > deadline else \
+                    GROUNDING_LIMIT
+                channel.send(RESULT, status, report)
+                return
+            grounded.facts.update(facts)
+        else:
+            grounded.ground('\n'.join([rules, *facts]), facts, instance)
+    else:
+        grounded.channel = channel
+        if extension:
+            grounded.ground('\n'.join(extension), extension)
+    time_ground = time.perf_counter() - start
+    ctl = grounded.ctl
+    ctl.configuration.solve.models = settings['models']
+    ctl.configuration.solve.opt_mode = settings['opt_mode']
+    status = None
+    optimization = False
+    with ctl.solve(yield_=True, async_=True) as handle:
+        while status is None:
+            handle.resume()
+            while not handle.wait(POLLING_INTERVAL):
+                if channel.cancelled() or time.monotonic() > deadline:
+                    handle.cancel()
+                    status = CANCELLED if channel.cancelled() else TIMEOUT
+                    break
+            else:
+                model = handle.model()
+                if model is None:
+                    result = handle.get()
+                    if result.satisfiable and result.exhausted and optimization:
+                        status = OPTIMUM_FOUND
+                    elif result.satisfiable:
+                        status = SATISFIABLE
+                    elif result.unsatisfiable:
+                        status = UNSATISFIABLE
+                    else:
+                        status = UNKNOWN
+                else:
+                    optimization = bool(model.cost)
+                    channel.send(MODEL, _shown(model, show), model.cost, model.optimality_proven)
+    channel.send(RESULT, status, {**statistics(ctl, time_ground), **report, 'reused': extension is not None})
+    _controls[key] = grounded
+    while len(_controls) > constants.CONTROLS_PER_WORKER:
+        _controls.popitem(last=False)
+
+
+def _format_states(model: clingo.Model, horizon: int) -> str:
+    """Print the atoms of a telingo model grouped by state, as telingo does."""
+    table = {}
+    for symbol in model.symbols(shown=True):
+        if symbol.type == clingo.SymbolType.Function and symbol.arguments:
+            table.setdefault(symbol.arguments[-1].number, []).append(
+                clingo.Function(symbol.name, symbol.arguments[:-1], symbol.positive))
+    output = []
+    for step in range(horizon + 1):
+        output.append(f" State {step}:")
+        signature = None
+        for symbol in sorted(table.get(step, [])):
+            if not symbol.name.startswith('__'):
+                if (symbol.name, len(symbol.arguments), symbol.positive) != signature:
+                    output.append("\n ")
+                    signature = (symbol.name, len(symbol.arguments), symbol.positive)
+                output.append(f" {symbol}")
+        output.append("\n")
+    return ''.join(output)
+
+
+def solve_telingo(payload, channel: pool.Channel):
+    """
+    Run the incremental solving loop of telingo, reporting the time spent on each step.
+
+    If stop_at_first_model, the program is solved at each horizon until a model is found, as telingo does;
+    otherwise it is only solved at the given horizon. The horizon is the maximum number of states.
+    """
+    import telingo.theory
+    import telingo.transformers
+
+    program, time_limit, horizon, stop_at_first_model = payload
+    deadline = time.monotonic() + time_limit
+    ctl = clingo.Control(["--stats", "--warn=none"])
+    with ast.ProgramBuilder(ctl) as builder:
+        future_signatures, program_parts = telingo.transformers.transform([program], builder.add)
+    theory = telingo.theory.Theory()
+    time_ground = 0
+    time_steps = []
+    status = None
+    result = None
+    step = 0
+    while status is None:
+        start = time.perf_counter()
+        parts = []
+        for root, name, offsets in program_parts:
+            for offset in offsets:
+                if (root == "always" and step - offset >= 0) or (root == "dynamic" and step - offset > 0) or \
+                        (root == "initial" and step - offset == 0):
+                    parts.append((name, [clingo.Number(step - offset), clingo.Number(step)]))
+        if step > 0:
+            ctl.release_external(clingo.Function("__final", [clingo.Number(step - 1)]))
+            ctl.cleanup()
+        ctl.ground(parts)
+        theory.translate(step, ctl)
+        ctl.assign_external(clingo.Function("__final", [clingo.Number(step)]), True)
+        time_ground += time.perf_counter() - start
+        last = step == horizon - 1
+        if stop_at_first_model or last:
+            assumptions = []
+            for name, arity, positive in future_signatures:
+                for atom in ctl.symbolic_atoms.by_signature(name, arity, positive):
+                    if atom.symbol.arguments[-1].number > step:
+                        assumptions.append(-atom.literal)
+            on_model = lambda model, step=step: channel.send(OUTPUT, _format_states(model, step))
+            with ctl.solve(on_model=on_model, assumptions=assumptions, async_=True) as handle:
+                while not handle.wait(POLLING_INTERVAL):
+                    if channel.cancelled() or time.monotonic() > deadline:
+                        handle.cancel()
+                        break
+                result = handle.get()
+            if result.satisfiable:
+                status = SATISFIABLE
+            elif last:
+                status = UNSATISFIABLE if result.unsatisfiable else UNKNOWN
+        time_steps.append(time.perf_counter() - start)
+        channel.send(STEP, step, time_steps[-1])
+        if status is None and (channel.cancelled() or time.monotonic() > deadline):
+            status = CANCELLED if channel.cancelled() else TIMEOUT
+        step += 1
+    # the statistics of the solver are only available once it was called
+    summary = statistics(ctl, time_ground) if result is not None else {}
+    channel.send(RESULT, status, {**summary, 'horizon': step, 'time_steps': time_steps})
+
+
+class SolveJob(pool.Job):
+    """
+    Solves an ASP program on the worker pool, collecting the answer sets as soon as they are found.
+
+    models is the number of answer sets to compute (0 for all of them). With optimal_only, clingo enumerates
+    the optimal answer sets, and those found while converging to the optimum are discarded. The completed
+    results are cached by program and options. If the sections of the program are given, and
+    constants.GROUNDING_LIMIT is set, its grounding is analyzed first, and the run is refused if it exceeds the limit.
+    The sections must hold all the rules of the program, since the control grounded by the analysis is solved.
+
+    show lists the predicates (name/arity) of the atoms printed, all of them if empty. The workers keep the last
+    controls they grounded, so that the jobs only changing show, models, optimal_only or adding facts unused by
+    the rules do not ground the program again. The instance (see instances.Instance) holds the facts solved with
+    the program, passed to clingo one batch at a time, and cached apart from it.
+    """
+
+    def __init__(self, program: str, time_limit: float, models: int = 1, optimal_only: bool = False,
+                 threads: int = 1, parallel_mode: str = PARALLEL_MODES[0], sections: list[tuple[str, str]] = None,
+                 show: list[str] = (), instance=None):
+        options = []
+        if threads > 1:
+            options.append(f"--parallel-mode={threads},{parallel_mode}")
+        settings = {'models': str(models), 'opt_mode': 'optN' if optimal_only else 'opt'}
+        show = {(name, int(arity)) for name, arity in (predicate.rsplit('/', 1) for predicate in show)}
+        if constants.GROUNDING_LIMIT is None:
+            sections = None
+        self.submitted = time.perf_counter()
+        rules, facts = split_facts(program)
+        instance_key, batches = (instance.key, instance.batches) if instance is not None else (None, ())
+        # the facts cut from the program leave empty lines, which do not change the rules
+        control = cache.digest('control', [line for line in rules.splitlines() if line.strip()], options, instance_key)
+        super().__init__(solve_clingo, (control, rules, facts, batches, show, settings, options, time_limit,
+                                        sections, constants.GROUNDING_LIMIT), time_limit, affinity=control)
+        self.optimal_only = optimal_only
+        self.resent = False
+        self.models: list[Model] = []
+        self.messages: list[str] = []
+        self.statistics = {}
+        self.grounding = None
+        self.status = RUNNING
+        self.key = cache.digest('clingo', program, instance_key, sorted(show), options, settings)
+        cached = cache.solver_cache.get(self.key)
+        if cached is not None:
+            models, self.status, self.statistics = cached
+            self.models = list(models)
+            self.grounding = self.statistics.get('grounding')
+            super().on_finish()
+            return
+        try:
+            pool.get_pool().submit(self)
+        except pool.PoolBusy as e:
+            self.on_finish(str(e))
+
+    @property
+    def running(self) -> bool:
+        return self.status == RUNNING
+
+    def worker_payload(self, kept: bool):
+        # the worker running the last job of the control likely kept it, and does not need the instance again
+        if kept and not self.resent and self.payload[3]:
+            return self.payload[:3] + (None,) + self.payload[4:]
+        return self.payload
+
+    def on_message(self, kind, *data):
+        if kind == MODEL:
+            model = Model(*data)
+            if not self.optimal_only or model.optimal or not model.cost:
+                self.models.append(model)
+        elif kind == MESSAGE:
+            self.messages.append(data[0])
+        elif kind == GROUNDING:
+            self.grounding = data[0]
+        elif kind == RESULT:
+            self.status, self.statistics = data
+
+    def on_finish(self, error: str = None):
+        if error is None and self.status == RESEND:
+            self.status = RUNNING
+            self.resent = True
+            try:
+                pool.get_pool().submit(self)
+                return
+            except pool.PoolBusy as e:
+                error = str(e)
+        if error is not None:
+            self.messages.append(error)
+            self.status = CANCELLED if self.cancelled else ERROR
+        elif self.status in COMPLETED:
+            cache.solver_cache.put(self.key, (self.models, self.status, self.statistics))
+        metrics.solver_results.inc('clingo', self.status)
+        metrics.solver_durations.observe(time.perf_counter() - self.submitted, 'clingo')
+        super().on_finish(error)
+
+
+class TelingoJob(pool.Job):
+    """
+    Runs telingo on the worker pool, following the horizon reached and the time spent on each step.
+
+    The output is the model found, printed by state, or the empty string. The completed results are cached as
+    those of SolveJob.
+    """
+
+    def __init__(self, program: str, time_limit: float, horizon: int, stop_at_first_model: bool = True):
+        super().__init__(solve_telingo, (program, time_limit, horizon, stop_at_first_model), time_limit)
+        self.submitted = time.perf_counter()
+        self.output = ''
+        self.steps: list[float] = []
+        self.messages: list[str] = []
+        self.statistics = {}
+        self.status = RUNNING
+        self.key = cache.digest('telingo', program, horizon, stop_at_first_model)
+        cached = cache.solver_cache.get(self.key)
+        if cached is not None:
+            self.output, steps, self.status, self.statistics = cached
+            self.steps = list(steps)
+            super().on_finish()
+            return
+        try:
+            pool.get_pool().submit(self)
+        except pool.PoolBusy as e:
+            self.on_finish(str(e))
+
+    @property
+    def running(self) -> bool:
+        return self.status == RUNNING
+
+    def on_message(self, kind, *data):
+        if kind == STEP:
+            self.steps.append(data[1])
+        elif kind == OUTPUT:
+            self.output = data[0]
+        elif kind == RESULT:
+            self.status, self.statistics = data
+
+    def on_finish(self, error: str = None):
+        if error is not None:
+            self.messages.append(error)
+            self.status = CANCELLED if self.cancelled else ERROR
+        elif self.status in COMPLETED:
+            cache.solver_cache.put(self.key, (self.output, self.steps, self.status, self.statistics))
+        metrics.solver_results.inc('telingo', self.status)
+        metrics.solver_durations.observe(time.perf_counter() - self.submitted, 'telingo')
+        super().on_finish(error)
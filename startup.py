@@ -0,0 +1,83 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+
+import constants
+
+PAGES = ['pages/cnl2aspui.py', 'pages/asp2cnlui.py', 'pages/cnl2telui.py']
+WARM_UP_CNL = "A movie is identified by an id."
+
+
+def warm_up():
+    """Import the compilers, build their Lark parsers, load clingo and start the workers of the pool."""
+    import clingo
+
+    import conversion
+    import incremental
+    import pool
+
+    pool.get_pool()
+    incremental.cnl_parser()
+    conversion.cnl_to_asp(WARM_UP_CNL)
+    conversion.definition_symbols(WARM_UP_CNL)
+    ctl = clingo.Control()
+    ctl.add("base", [], "a.")
+    ctl.ground([("base", [])])
+    ctl.solve()
+
+
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+
+
+def start_warm_up():
+    """Run the warm up once per server, in the background, if enabled in constants.WARM_UP."""
+    global _warm_up_thread
+    with _warm_up_lock:
+        if constants.WARM_UP and _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=warm_up, daemon=True)
+            _warm_up_thread.start()
+
+
+def measure(setup: str, statement: str) -> float:
+    """Return the seconds taken by the statement in a new interpreter, after running the setup."""
+    code = f"import time\n{setup}\nstart = time.perf_counter()\n{statement}\nprint(time.perf_counter() - start)"
+    root = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run([sys.executable, '-c', code], cwd=root, env={**os.environ, 'PYTHONPATH': root},
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.splitlines()[-1])
+
+
+def benchmarks() -> dict[str, tuple[str, str]]:
+    """The cold start benchmarks: the first run of each page, and the warm up."""
+    cases = {}
+    for page in PAGES:
+        cases[os.path.splitext(os.path.basename(page))[0]] = (
+            "from streamlit.testing.v1 import AppTest",
+            f"AppTest.from_file({page!r}, default_timeout=120).run()")
+    cases['warm_up'] = ("import startup", "startup.warm_up()")
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the cold start time of the pages and of the warm up.')
+    parser.add_argument('-n', '--repeat', type=int, default=3, help='runs of each benchmark, in new interpreters')
+    parser.add_argument('--max-seconds', type=float,
+                        help='exit with an error if the median time of a benchmark exceeds this value')
+    args = parser.parse_args()
+
+    failures = 0
+    for name, (setup, statement) in benchmarks().items():
+        times = [measure(setup, statement) for _ in range(args.repeat)]
+        median = statistics.median(times)
+        slow = args.max_seconds is not None and median > args.max_seconds
+        failures += slow
+        print(f"{name}: median {median:.3f}s, min {min(times):.3f}s, max {max(times):.3f}s{' (too slow)' if slow else ''}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import importlib.metadata
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+import constants
+
+LIBRARIES = ['cnl2asp', 'asp2cnl', 'clingo', 'telingo', 'ngo']
+EVICTION_INTERVAL = 100
+# the time of the last read of an entry is only written when it is older than ACCESS_INTERVAL seconds, and the
+# reads are written together ACCESS_FLUSH_DELAY seconds later, so that reading does not write to the file
+ACCESS_INTERVAL = 600
+ACCESS_FLUSH_DELAY = 5
+
+
+def library_versions() -> dict[str, str]:
+    versions = {}
+    for library in LIBRARIES:
+        try:
+            versions[library] = importlib.metadata.version(library)
+        except importlib.metadata.PackageNotFoundError:
+            versions[library] = None
+    return versions
+
+
+class PersistentStore:
+    """
+    A cache in a SQLite file, shared by the processes of a host and surviving restarts.
+
+    The values are pickled. The entries not read for max_age seconds are evicted, as well as the least recently read
+    ones when the file holds more than max_bytes of values. The keys include the versions of the libraries, so that
+    the results of other versions are never returned.
+    """
+
+    def __init__(self, path: str, max_bytes: int, max_age: float):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._versions = repr(sorted(library_versions().items()))
+        self._local = threading.local()
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._accessed = {}
+        self._flush_timer = None
+        with self._connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, "
+                               "size INTEGER, accessed REAL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite connections cannot be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{namespace}:{key}:{self._versions}"
+
+    def get(self, namespace: str, key: str, default=None):
+        key = self._key(namespace, key)
+        row = self._connection().execute("SELECT value, accessed FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return default
+        now = time.time()
+        if now - row[1] > ACCESS_INTERVAL:
+            self._touch(key, now)
+        try:
+            return pickle.loads(row[0])
+        except Exception:
+            # written by an incompatible version of this application
+            return default
+
+    def _touch(self, key: str, accessed: float):
+        with self._lock:
+            self._accessed[key] = accessed
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(ACCESS_FLUSH_DELAY, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush(self):
+        """Write the times of the reads not written yet."""
+        with self._lock:
+            accessed, self._accessed = self._accessed, {}
+            self._flush_timer = None
+        if not accessed:
+            return
+        # the connection is not kept, since the thread of the timer is not reused
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                connection.executemany("UPDATE entries SET accessed = ? WHERE key = ?",
+                                       [(read, key) for key, read in accessed.items()])
+        finally:
+            connection.close()
+
+    def put(self, namespace: str, key: str, value):
+        try:
+            data = pickle.dumps(value)
+        except Exception:
+            # the value cannot be stored, it is only kept in memory
+            return
+        if len(data) > self.max_bytes:
+            return
+        with self._connection() as connection:
+            connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                               (self._key(namespace, key), data, len(data), time.time()))
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % EVICTION_INTERVAL == 1
+        if evict:
+            self.evict()
+
+    def evict(self):
+        self.flush()
+        with self._connection() as connection:
+            connection.execute("DELETE FROM entries WHERE accessed < ?", (time.time() - self.max_age,))
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                # the least recently read entries exceeding the size are removed
+                connection.execute("DELETE FROM entries WHERE key IN (SELECT key FROM (SELECT key, SUM(size) OVER "
+                                   "(ORDER BY accessed DESC) AS total FROM entries) WHERE total > ?)",
+                                   (self.max_bytes,))
+
+    def stats(self) -> dict:
+        with self._connection() as connection:
+            entries, size = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {'path': self.path, 'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> PersistentStore:
+    """Return the store of the process, or None if constants.PERSISTENT_CACHE_PATH is not set."""
+    global _store
+    if constants.PERSISTENT_CACHE_PATH is None:
+        return None
+    with _store_lock:
+        if _store is None:
+            os.makedirs(os.path.dirname(os.path.abspath(constants.PERSISTENT_CACHE_PATH)), exist_ok=True)
+            _store = PersistentStore(constants.PERSISTENT_CACHE_PATH, constants.PERSISTENT_CACHE_SIZE,
+                                     constants.PERSISTENT_CACHE_MAX_AGE)
+        return _store
@@ -0,0 +1,25 @@
+import conversion
+
+
+def test_split_rules_normalizes_whitespace():
+    assert conversion.split_rules('q :-   r,\n s.\np.') == ['q :- r, s.', 'p.']
+
+
+def test_split_rules_keeps_strings():
+    assert conversion.split_rules('a("x. %y  z").\nb("\\"." ).') == ['a("x. %y  z").', 'b("\\"." ).']
+
+
+def test_split_rules_drops_comments():
+    assert conversion.split_rules('a. % b.\n%* c.\nd. *%\ne.%*') == ['a.', 'e.']
+
+
+def test_split_rules_keeps_ranges():
+    assert conversion.split_rules('b(1..3). c(X) :- X = 1 .. 2.') == ['b(1..3).', 'c(X) :- X = 1 .. 2.']
+
+
+def test_split_rules_keeps_weights_of_weak_constraints():
+    assert conversion.split_rules(':~ p(X). [X@1, X]\n:~ q.\n  [1]\nr.') == [':~ p(X). [X@1, X]', ':~ q. [1]', 'r.']
+
+
+def test_split_rules_keeps_unterminated_rules():
+    assert conversion.split_rules('a. b :- c') == ['a.', 'b :- c']
@@ -0,0 +1,52 @@
+import pytest
+from lark.exceptions import UnexpectedInput
+
+import incremental
+from benchmarks import corpus
+
+
+def test_split_statements_on_full_stops():
+    text = 'A person is identified by an id. B is 1.5.\nC'
+    assert incremental.split_statements(text) == ['A person is identified by an id.', ' B is 1.5.', '\nC']
+
+
+def test_split_statements_skips_strings_and_comments():
+    text = 'A is "d. e". /* a. b. */ B. // c.\nD.'
+    assert incremental.split_statements(text) == ['A is "d. e".', ' /* a. b. */ B.', ' // c.\nD.']
+
+
+def test_split_statements_keeps_the_text():
+    text = 'A. /* unterminated. comment'
+    statements = incremental.split_statements(text)
+    assert ''.join(statements) == text
+    assert statements == ['A.', ' /* unterminated. comment']
+
+
+def test_split_statements_skips_blank_remainders():
+    assert incremental.split_statements('A.\n\n') == ['A.']
+    assert incremental.split_statements('') == []
+
+
+def _full_compile(cnl_input: str):
+    with incremental.compile_lock:
+        return incremental.Cnl2asp(cnl_input).compile()
+
+
+# the large programs take a minute to compile, they are left to the benchmarks
+@pytest.mark.parametrize('size', [corpus.SIZES['small'], corpus.SIZES['medium']])
+def test_compile_statements_matches_the_full_compiler(size):
+    program = corpus.cnl_program(size)
+    encoding, _ = incremental.compile_statements(program)
+    assert encoding == _full_compile(program)
+    # an edit only recompiles the modified statement
+    edited = program.replace('is equal to 2', 'is equal to 3')
+    assert incremental.compile_statements(edited)[0] == _full_compile(edited)
+
+
+def test_compile_statements_refuses_definitions_after_propositions():
+    program = ("A movie is identified by an id.\nA topmovie is identified by an id.\nA movie goes from 1 to 3.\n"
+               "Whenever there is a movie with id X, then we can have a topmovie with id X.\n"
+               "A movie is identified by an id, and has a year.\n")
+    assert incremental.compile_statements(program) is None
+    with pytest.raises(UnexpectedInput):
+        _full_compile(program)
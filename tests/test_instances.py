@@ -0,0 +1,74 @@
+import io
+
+import clingo
+import pytest
+
+import cache
+import constants
+import instances
+import uploads
+
+
+def _parses(program: str) -> bool:
+    ctl = clingo.Control()
+    ctl.add('base', [], program)
+    return True
+
+
+def test_term_keeps_canonical_integers():
+    assert [instances._term(value) for value in ['0', '12', '-3', ' 7 ']] == ['0', '12', '-3', '7']
+
+
+def test_term_quotes_other_values():
+    assert instances._term('08') == '"08"'
+    assert instances._term('-0') == '-0'
+    assert instances._term('1.5') == '"1.5"'
+    assert instances._term('+1') == '"+1"'
+    assert instances._term('a "b"\\c') == '"a \\"b\\"\\\\c"'
+
+
+def test_csv_batches(monkeypatch):
+    monkeypatch.setattr(constants, 'INSTANCE_BATCH_SIZE', 2)
+    batches, statements = instances._csv_batches('id,name\n1,a\n\n2,"b, c"\n3,08\n', 'movie')
+    assert statements == 3
+    assert batches == ['movie(1,"a").\nmovie(2,"b, c").', 'movie(3,"08").']
+
+
+def test_lp_batches_cut_after_statements(monkeypatch):
+    monkeypatch.setattr(constants, 'INSTANCE_BATCH_SIZE', 2)
+    program = 'a("x. y").\n%* b. c. *%\nd(1..2). % e.\n:~ f. [1@2, g]\nh.\ni.\n'
+    batches, statements = instances._lp_batches(program)
+    assert statements == 5
+    assert ''.join(batches) == program
+    assert batches[0].endswith('d(1..2).')
+    assert batches[1].endswith('[1@2, g]\nh.')
+    for batch in batches:
+        assert _parses(batch)
+
+
+def test_lp_batches_skip_blank_remainders(monkeypatch):
+    monkeypatch.setattr(constants, 'INSTANCE_BATCH_SIZE', 1)
+    assert instances._lp_batches('a.\nb.\n\n') == (['a.', '\nb.'], 2)
+    assert instances._lp_batches('') == ([], 0)
+
+
+def test_predicate_name():
+    assert instances.predicate_name('data/Movie Ratings-2024.csv') == 'movie_ratings_2024'
+    with pytest.raises(uploads.UploadError):
+        instances.predicate_name('2024.csv')
+
+
+class _Upload(io.BytesIO):
+
+    def __init__(self, name: str, data: bytes):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+def test_read_instance_keeps_only_the_batches():
+    cache.upload_cache.clear()
+    cache.instance_cache.clear()
+    instance = instances.read_instance(_Upload('Movies.csv', b'id,title\n1,"Heat"\n'))
+    assert instance.batches == ('movies(1,"Heat").',) and instance.statements == 1
+    assert cache.upload_cache.stats()['entries'] == 0
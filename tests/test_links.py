@@ -0,0 +1,68 @@
+import base64
+import urllib.parse
+
+import pytest
+from dumbo_utils.url import compress_object_for_url
+
+import constants
+import links
+
+STATE = {'cnl_statements': 'A person is identified by an id, and has a name.\n' * 20, 'run_solver': True,
+         'selected_symbols': ['person/2'], 'note': 'é "quoted" \\'}
+
+
+def test_frame_round_trip():
+    frame = links._encode_frame(STATE)
+    assert frame[:2] == bytes([links.VERSION, links.DEFLATE])
+    assert links._decode_frame(frame) == STATE
+
+
+def test_frame_stores_incompressible_states():
+    frame = links._encode_frame({})
+    assert frame == bytes([links.VERSION, links.STORED]) + b'{}'
+    assert links._decode_frame(frame) == {}
+
+
+@pytest.mark.parametrize('frame', [b'', bytes([0, links.STORED]) + b'{}', bytes([links.VERSION, 9]) + b'{}',
+                                   bytes([links.VERSION, links.STORED]) + b'[]'])
+def test_decode_frame_rejects_unknown_frames(frame):
+    with pytest.raises(ValueError):
+        links._decode_frame(frame)
+
+
+def test_codec_round_trip():
+    value = links.encode(STATE)
+    assert urllib.parse.quote(value, safe='') == value
+    assert links.decode(value) == STATE
+    assert len(value) < len(compress_object_for_url(STATE))
+
+
+def test_decode_legacy_round_trip():
+    value = urllib.parse.unquote(compress_object_for_url(STATE))
+    assert links.decode_legacy(value) == STATE
+    # the + of the base64 encoding become spaces in the unquoted urls
+    assert links.decode_legacy(value.replace('+', ' ')) == STATE
+
+
+def test_shared_state_ignores_broken_parts():
+    legacy = urllib.parse.unquote(compress_object_for_url({'definitions': 'd'}))
+    params = {links.STATE: links.encode({'run_solver': False}), 'old': legacy, 'broken': 'x!'}
+    assert links.shared_state(params, ['old', 'broken']) == {'run_solver': False, 'definitions': 'd'}
+    assert links.shared_state({links.STATE: base64.urlsafe_b64encode(b'\x01\x01xx').decode()}) == {}
+
+
+def test_share_uses_short_links_for_long_states(tmp_path, monkeypatch):
+    monkeypatch.setattr(constants, 'SHORT_LINKS_PATH', str(tmp_path / 'links.db'))
+    monkeypatch.setattr(links, '_link_store', None)
+    short = {'definitions': 'd'}
+    url = links.share('page', short)
+    assert f'?{links.STATE}=' in url
+    assert links.shared_state({links.STATE: url.split('=', 1)[1]}) == short
+
+    monkeypatch.setattr(constants, 'LINK_LENGTH_LIMIT', 10)
+    url = links.share('page', STATE)
+    assert f'?{links.SHORT_LINK}=' in url
+    link_id = url.split('=', 1)[1]
+    assert links.share('page', STATE) == url
+    assert links.shared_state({links.SHORT_LINK: link_id}) == STATE
+    assert links.shared_state({links.SHORT_LINK: 'missing'}) == {}
@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import cache
+import constants
+import llm
+
+MODELS = ['first', 'second']
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Answer the chat completions with the responses queued for each model, streaming their chunks."""
+    responses = {}
+    requests = []
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.requests.append((self.path, request))
+        status, headers, chunks = self.responses[request['model']].pop(0)
+        self.send_response(status)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        if status != 200:
+            body = json.dumps({'error': {'message': 'failed', 'type': 'error'}}).encode()
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for content in chunks:
+            chunk = {'id': 'c', 'object': 'chat.completion.chunk', 'created': 0, 'model': request['model'],
+                     'choices': [{'index': 0, 'delta': {'content': content}, 'finish_reason': None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(constants, 'LLM_MODELS', MODELS)
+    monkeypatch.setattr(llm, '_suspended_until', {})
+    monkeypatch.setattr(llm, '_clients', {})
+    monkeypatch.setattr(_Handler, 'responses', {model: [] for model in MODELS})
+    monkeypatch.setattr(_Handler, 'requests', [])
+    cache.llm_cache.clear()
+    http_server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{http_server.server_port}"
+    http_server.shutdown()
+    http_server.server_close()
+    cache.llm_cache.clear()
+
+
+def test_get_client_is_shared(server):
+    client = llm.get_client('key', server)
+    assert llm.get_client('key', server) is client
+    assert llm.get_client('other', server) is not client
+    assert client.max_retries == 0
+
+
+def test_improve_clarity_streams_and_caches(server):
+    _Handler.responses['first'].append((200, {}, ['A clear', ' text.']))
+    client = llm.get_client('key', server)
+    assert list(llm.improve_clarity(client, 'cnl')) == ['A clear', ' text.']
+    path, request = _Handler.requests[0]
+    assert path == '/openai/v1/chat/completions'
+    assert request['stream'] and request['messages'][-1] == {'role': 'user', 'content': 'cnl'}
+    assert list(llm.improve_clarity(client, 'cnl')) == ['A clear text.']
+    assert len(_Handler.requests) == 1
+
+
+def test_improve_clarity_falls_back_on_failures(server):
+    _Handler.responses['first'].append((500, {}, []))
+    _Handler.responses['second'].append((200, {}, ['Rewritten.']))
+    assert list(llm.improve_clarity(llm.get_client('key', server), 'cnl')) == ['Rewritten.']
+    assert [request['model'] for _, request in _Handler.requests] == MODELS
+    assert llm.available_models() == ['second']
+    assert llm._suspended_until['first'] > time.monotonic() + constants.LLM_FAILURE_BACKOFF - 5
+
+
+def test_rate_limited_models_recover_after_retry_after(server, monkeypatch):
+    _Handler.responses['first'].append((429, {'retry-after': '30'}, []))
+    _Handler.responses['second'].append((429, {}, []))
+    client = llm.get_client('key', server)
+    with pytest.raises(llm.ModelsUnavailable):
+        list(llm.improve_clarity(client, 'cnl'))
+    assert llm.available_models() == []
+    now = time.monotonic()
+    assert now + 25 < llm._suspended_until['first'] <= now + 30
+    assert llm._suspended_until['second'] > now + constants.LLM_RATE_LIMIT_BACKOFF - 5
+
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 31)
+    assert llm.available_models() == ['first']
+    _Handler.responses['first'].append((200, {}, ['Back.']))
+    assert list(llm.improve_clarity(client, 'cnl')) == ['Back.']
@@ -0,0 +1,42 @@
+import solver
+
+
+def test_split_facts_keeps_rules_and_cuts_facts():
+    rules, facts = solver.split_facts('p(X) :- q(X).\nq(1). q(2).\nr :- q(1).\n')
+    assert facts == ['q(1).', 'q(2).']
+    assert rules.split() == ['p(X)', ':-', 'q(X).', 'r', ':-', 'q(1).']
+
+
+def test_split_facts_keeps_statements_spanning_lines():
+    rules, facts = solver.split_facts('a :- b,\n c(1).\n')
+    assert facts == []
+    assert rules == 'a :- b,\n c(1).\n'
+
+
+def test_split_facts_ignores_comments():
+    rules, facts = solver.split_facts('%*\np(3).\n*%\n% q(1).\nr.\n')
+    assert facts == ['r.']
+    assert 'p(3).' in rules and 'q(1).' in rules
+
+
+def test_split_facts_only_takes_ground_atoms():
+    program = 't(1..2).\nu(1;2).\nx(1+2).\nv(X) :- w(X).\n{ z(1) }.\n'
+    rules, facts = solver.split_facts(program + '-y(1).\ns("a. b", f(1), -2).\n')
+    assert facts == ['-y(1).', 's("a. b",f(1),-2).']
+    assert rules.strip() == program.strip()
+
+
+def test_split_facts_only_takes_base_facts():
+    rules, facts = solver.split_facts('a(1).\n#program step(t).\nb(1).\n#program base.\nc(1).\n')
+    assert facts == ['a(1).', 'c(1).']
+    assert 'b(1).' in rules
+
+
+def test_split_facts_cuts_after_multibyte_characters():
+    rules, facts = solver.split_facts('r("é") :- s. q("è").\n')
+    assert facts == ['q("è").']
+    assert rules.strip() == 'r("é") :- s.'
+
+
+def test_split_facts_returns_unparsable_programs():
+    assert solver.split_facts('a :- b(.\nc.') == ('a :- b(.\nc.', [])
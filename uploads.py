@@ -0,0 +1,55 @@
+import codecs
+import hashlib
+
+import cache
+import constants
+
+
+class UploadError(Exception):
+    pass
+
+
+def upload_digest(uploaded_file) -> str:
+    """Return a hash of the content of an uploaded file, read chunk by chunk."""
+    hasher = hashlib.blake2b(digest_size=16)
+    uploaded_file.seek(0)
+    while chunk := uploaded_file.read(constants.UPLOAD_CHUNK_SIZE):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _check_size(uploaded_file, max_bytes: int):
+    if uploaded_file.size > max_bytes:
+        raise UploadError(f"{uploaded_file.name} is {uploaded_file.size / 1024 / 1024:.1f} MiB, "
+                          f"the limit is {max_bytes / 1024 / 1024:.0f} MiB.")
+
+
+def decode_upload(uploaded_file, max_bytes: int = constants.UPLOAD_SIZE_LIMIT) -> str:
+    """Decode an uploaded UTF-8 file chunk by chunk, refusing the files larger than max_bytes."""
+    _check_size(uploaded_file, max_bytes)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    parts = []
+    uploaded_file.seek(0)
+    try:
+        while chunk := uploaded_file.read(constants.UPLOAD_CHUNK_SIZE):
+            parts.append(decoder.decode(chunk))
+        parts.append(decoder.decode(b'', final=True))
+    except UnicodeDecodeError as e:
+        raise UploadError(f"{uploaded_file.name} is not a UTF-8 text file: {e}.")
+    return ''.join(parts)
+
+
+def read_upload(uploaded_file, max_bytes: int = constants.UPLOAD_SIZE_LIMIT) -> str:
+    """
+    Decode an uploaded UTF-8 file as decode_upload.
+
+    The decoded texts are shared by the sessions uploading the same file, so that a large input is held only once.
+    """
+    _check_size(uploaded_file, max_bytes)
+    key = upload_digest(uploaded_file)
+    text = cache.upload_cache.get(key)
+    if text is not None:
+        return text
+    text = decode_upload(uploaded_file, max_bytes)
+    cache.upload_cache.put(key, text)
+    return text
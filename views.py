@@ -0,0 +1,39 @@
+import streamlit as st
+
+import constants
+
+
+def _windows(text: str, key: str) -> tuple[int, list[int]]:
+    """Return the number of lines of a text and the offsets where its windows start, computed once per text."""
+    cached = st.session_state.get(key)
+    if cached is not None and cached[0] is text:
+        return cached[1], cached[2]
+    lines = 1
+    starts = [0]
+    position = text.find('\n')
+    while position != -1 and position + 1 < len(text):
+        if lines % constants.WINDOW_LINES == 0:
+            starts.append(position + 1)
+        lines += 1
+        position = text.find('\n', position + 1)
+    st.session_state[key] = (text, lines, starts)
+    return lines, starts
+
+
+def windowed_code(container, text: str, key: str, language: str = None, line_numbers: bool = False):
+    """
+    Show a text as code, only sending to the browser the window of lines selected by the user if it is long.
+
+    key identifies the selector of the window in the session state.
+    """
+    lines, starts = _windows(text, f'{key}_windows')
+    if len(starts) == 1:
+        container.code(text, language=language, line_numbers=line_numbers)
+        return
+    if st.session_state.get(key, 1) > len(starts):
+        st.session_state[key] = len(starts)
+    window = container.number_input(f"Lines window (of {len(starts)})", min_value=1, max_value=len(starts), key=key)
+    end = starts[window] - 1 if window < len(starts) else len(text)
+    first = (window - 1) * constants.WINDOW_LINES + 1
+    container.caption(f"Lines {first}-{min(first + constants.WINDOW_LINES - 1, lines)} of {lines}")
+    container.code(text[starts[window - 1]:end], language=language)